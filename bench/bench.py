@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*-
+#
+# Ringmaster benchmarks, against the "circusd.py" stand-in. Results are written
+# as JSON, and can be compared to those of a previous run.
+#
+#   python bench/bench.py --output after.json --baseline before.json
+#
+# NOTES
+#
+#   [B1] Every size runs against a fresh stand-in process, so the stand-in
+#   does not compete with Ringmaster for the event loop. Measures are:
+#
+#     discovery_seconds - From "setup" until every watcher is classified
+#     and has a stats sample.
+#
+#     refresh_seconds - Mean duration of a poll of the whole fleet.
+#
+#     round_trips_per_second - Named "status" requests, at most
+#     "_MAX_IN_FLIGHT" outstanding.
+#
+#     stats_received_per_second, stats_decoded_per_second - Messages read
+#     from the stats stream, and decoded after coalescing.
+#
+#     tk_update_ms, tk_update_p95_ms - Time of a render pass with every
+#     watcher changed, plus the Tk idle tasks it causes.
+#
+#   [B2] Tk needs an X display. Without one, an Xvfb server is started for the
+#   run. With "--headless" the Tk measures are skipped (reported as null),
+#   and the monitoring core runs without a window. Like in "main", the window
+#   waits in Tk with the asyncio loop, and polls Tk with the others.
+#
+#   [B3] A measure regresses when it is worse than the baseline by more than
+#   "--tolerance". Rates are better when higher, times when lower. Results
+#   are matched by event loop and number of watchers.
+#
+#   [B4] With "--loops", every size runs once per event loop implementation.
+#   Each loop is compared to the first one on the request path (control
+#   round trips and fleet polls) and on the ingest path (stats rates). The
+#   speedup is the ratio of the two measures, more than 1 is faster.
+#
+
+# Python.
+import os
+import sys
+from json import dump, load
+from time import monotonic, time
+from shutil import which
+from platform import platform, python_version
+from resource import getrusage, RUSAGE_SELF
+from argparse import ArgumentParser
+from subprocess import Popen, PIPE, DEVNULL
+from collections import OrderedDict
+from importlib.util import find_spec
+from asyncio import gather, sleep
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# Ringmaster.
+import ringmaster
+
+# Default numbers of watchers.
+_SIZES = (10, 100, 1000, 5000)
+
+# Control port of the first stand-in. Every size gets the next ten ports.
+_PORT = 25555
+
+# Seconds to wait for discovery to complete.
+_DISCOVERY_TIMEOUT = 120.0
+
+# Number of fleet polls, and of render passes, to average.
+_ROUNDS = 5
+_FRAMES = 20
+
+# Measures that are better when higher. See [B3].
+_HIGHER = ('round_trips_per_second', 'stats_received_per_second',
+           'stats_decoded_per_second')
+
+# Measures that are better when lower.
+_LOWER = ('discovery_seconds', 'refresh_seconds', 'tk_update_ms',
+          'tk_update_p95_ms')
+
+# Measures of the request and ingest paths, to compare loops on. See [B4].
+_PATHS = ('round_trips_per_second', 'refresh_seconds',
+          'stats_received_per_second', 'stats_decoded_per_second')
+
+def _display():  # See [B2].
+    '''Start an Xvfb server, and return its process.'''
+
+    if which('Xvfb') is None:
+        sys.exit('No X display and no Xvfb. Install Xvfb, or use --headless.')
+
+    r, w = os.pipe()
+    xvfb = Popen(['Xvfb', '-displayfd', str(w), '-screen', '0', '1280x1024x24',
+                  '-nolisten', 'tcp'], pass_fds=(w,), stderr=DEVNULL)
+
+    os.close(w)
+
+    with os.fdopen(r) as f:
+        number = f.readline().strip()
+
+    if not number:
+        sys.exit('Xvfb did not start.')
+
+    os.environ['DISPLAY'] = ':' + number
+
+    return xvfb
+
+def _circusd(port, args, watchers):
+    '''Start a stand-in process, and wait for its sockets.'''
+
+    script = os.path.join(os.path.dirname(__file__), 'circusd.py')
+    process = Popen([sys.executable, script,
+                     '--watchers', str(watchers),
+                     '--pids', str(args.pids),
+                     '--latency', str(args.latency),
+                     '--rate', str(args.rate),
+                     '--control', 'tcp://127.0.0.1:{}'.format(port)],
+                    stdout=PIPE, universal_newlines=True)
+
+    if process.stdout.readline().strip() != 'ready':
+        process.kill()
+
+        sys.exit('The circusd stand-in did not start.')
+
+    return process
+
+async def _until(condition, timeout):
+    start = monotonic()
+
+    while not condition():
+        if monotonic() - start > timeout:
+            raise RuntimeError('timed out')
+
+        await sleep(0.01)
+
+    return monotonic() - start
+
+async def _measure(root, args, watchers):  # See [B1].
+    result = {'watchers': watchers}
+    store = root._store
+    daemon = next(iter(root._daemons.values()))
+
+    # Discovery.
+    start = monotonic()
+
+    await root.setup()
+
+    root._spawn(root.paint())
+
+    await _until(lambda: len(store) == watchers and all(
+        store[x].singleton is not None and store[x].cpu is not None
+        for x in store), _DISCOVERY_TIMEOUT)
+
+    result['discovery_seconds'] = monotonic() - start
+
+    # Refresh.
+    start = monotonic()
+
+    for i in range(_ROUNDS):
+        await root._poll_all(daemon)
+
+    result['refresh_seconds'] = (monotonic() - start) / _ROUNDS
+
+    # Control round trips.
+    names = [store[x].watcher for x in store]
+    count = max(1000, len(names))
+    start = monotonic()
+
+    await gather(*[root._do_request(daemon, 'status',
+                                    names[i % len(names)])
+                   for i in range(count)])
+
+    result['round_trips_per_second'] = count / (monotonic() - start)
+
+    # Stats ingest.
+    before = daemon.ingest.received, daemon.ingest.decoded
+    start = monotonic()
+
+    await sleep(args.duration)
+
+    elapsed = monotonic() - start
+
+    result['stats_received_per_second'] = \
+        (daemon.ingest.received - before[0]) / elapsed
+    result['stats_decoded_per_second'] = \
+        (daemon.ingest.decoded - before[1]) / elapsed
+
+    # Tk updates.
+    result['tk_update_ms'] = result['tk_update_p95_ms'] = None
+
+    if not args.headless:
+        times = []
+
+        root.update_idletasks()
+
+        for i in range(_FRAMES):
+            for x in store:
+                store.update(x, cpu=(i + 1) / 100.0, mem=(i + 1) / 200.0)
+
+            start = monotonic()
+
+            root._render_rows(set(store))
+            root.update_idletasks()
+
+            times.append((monotonic() - start) * 1000)
+
+            await sleep(0)
+
+        times.sort()
+
+        result['tk_update_ms'] = sum(times) / len(times)
+        result['tk_update_p95_ms'] = times[int(len(times) * 0.95) - 1]
+
+    return result
+
+def _run(args, i, watchers, name):
+    port = _PORT + 10 * i
+    control = 'tcp://127.0.0.1:{}'.format(port)
+    daemons = [(control.partition('://')[2], control,
+                'tcp://127.0.0.1:{}'.format(port + 2),
+                'tcp://127.0.0.1:{}'.format(port + 1))]
+    selector = None
+
+    if not args.headless:
+        from ringmaster_tk import _Application, _TkSelector
+
+        if name == 'asyncio':
+            selector = _TkSelector()
+
+    loop = ringmaster._event_loop(name, selector)
+    circusd = _circusd(port, args, watchers)
+
+    if args.headless:
+        root, tk = ringmaster._Monitor(daemons, cache=None), None
+
+    else:
+        root = _Application(daemons, cache=None, selector=selector)
+        tk = loop.create_task(root.mainloop())
+
+    try:
+        result = loop.run_until_complete(_measure(root, args, watchers))
+        result['loop'] = name
+
+        return result
+
+    finally:
+        root._quit()
+
+        if tk is not None:
+            loop.run_until_complete(tk)
+
+            root.destroy()
+
+        loop.run_until_complete(root.shutdown())
+
+        root.close()
+
+        loop.run_until_complete(sleep(0))
+        loop.close()
+
+        circusd.terminate()
+        circusd.wait()
+
+def _compare(results, baseline, tolerance):  # See [B3].
+    '''Return the descriptions of regressions against a baseline.'''
+
+    regressions = []
+    previous = {(x.get('loop', 'asyncio'), x['watchers']): x
+                for x in baseline['results']}
+
+    for result in results:
+        old = previous.get((result['loop'], result['watchers']), {})
+
+        for key in _HIGHER + _LOWER:
+            a, b = old.get(key), result.get(key)
+
+            if a is None or b is None or a == 0:
+                continue
+
+            change = (b - a) / a
+
+            if key in _HIGHER and change < -tolerance or \
+                    key in _LOWER and change > tolerance:
+                regressions.append(
+                    '{} watchers ({}), {}: {:.4g} -> {:.4g}'.format(
+                        result['watchers'], result['loop'], key, a, b))
+
+    return regressions
+
+def _speedups(results, loops):  # See [B4].
+    '''Compare the results of every loop to those of the first one.'''
+
+    first = {x['watchers']: x for x in results if x['loop'] == loops[0]}
+    speedups = []
+
+    for result in results:
+        old = first[result['watchers']]
+
+        if result['loop'] == loops[0]:
+            continue
+
+        speedup = OrderedDict()
+
+        for key in _PATHS:
+            a, b = old.get(key), result.get(key)
+
+            if a and b:
+                speedup[key] = b / a if key in _HIGHER else a / b
+
+        speedups.append(OrderedDict([
+            ('watchers', result['watchers']), ('loop', result['loop']),
+            ('versus', loops[0]), ('speedup', speedup)]))
+
+    return speedups
+
+def _arguments(argv=None):
+    '''Parse the command line.'''
+
+    parser = ArgumentParser(description='Ringmaster benchmarks.')
+
+    parser.add_argument('--sizes', default=','.join(map(str, _SIZES)),
+                        help='comma separated numbers of watchers '
+                             '(default: {})'.format(','.join(map(str,
+                                                                 _SIZES))))
+    parser.add_argument('--loops', default=ringmaster._LOOPS[0],
+                        help='comma separated event loops, out of {} '
+                             '(default: {})'.format(
+                                 ', '.join(ringmaster._LOOPS),
+                                 ringmaster._LOOPS[0]))
+    parser.add_argument('--pids', type=int, default=2,
+                        help='processes per watcher (default: 2)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds before each reply (default: 0)')
+    parser.add_argument('--rate', type=int, default=10000,
+                        help='stats messages per second (default: 10000)')
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help='seconds of stats ingest (default: 5)')
+    parser.add_argument('--headless', action='store_true',
+                        help='skip the Tk measures, and run without X')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write results to a file, instead of stdout')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare to the results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative regression (default: 0.2)')
+
+    args = parser.parse_args(argv)
+    args.sizes = [int(x) for x in args.sizes.split(',')]
+    args.loops = args.loops.split(',')
+
+    for x in args.loops:
+        if x not in ringmaster._LOOPS:
+            parser.error('unknown event loop {}'.format(x))
+
+        elif x != 'asyncio' and find_spec(x) is None:
+            parser.error('{} is not installed'.format(x))
+
+    return args
+
+def main():
+    args = _arguments()
+    xvfb = None
+
+    if not args.headless and not os.environ.get('DISPLAY'):
+        xvfb = _display()
+
+    try:
+        results = []
+        runs = [(x, y) for x in args.sizes for y in args.loops]
+
+        for i, (watchers, name) in enumerate(runs):
+            results.append(_run(args, i, watchers, name))
+
+            print('{} watchers done ({})'.format(watchers, name),
+                  file=sys.stderr)
+
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    report = {
+        'time': time(),
+        'python': python_version(),
+        'platform': platform(),
+        'parameters': {'pids': args.pids, 'latency': args.latency,
+                       'rate': args.rate, 'duration': args.duration,
+                       'headless': args.headless, 'loops': args.loops},
+        'max_rss_kb': getrusage(RUSAGE_SELF).ru_maxrss,
+        'results': results,
+        'speedups': _speedups(results, args.loops),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            dump(report, f, indent=2)
+
+    else:
+        dump(report, sys.stdout, indent=2)
+
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _compare(results, load(f), args.tolerance)
+
+        for x in regressions:
+            print('Regression: ' + x, file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*-
+#
+# A stand-in for circusd, to benchmark Ringmaster against. It speaks the Circus
+# control protocol on a ROUTER socket, and publishes synthetic stats and
+# watcher events on PUB sockets. There are no real processes behind the
+# watchers, PIDs are made up.
+#
+#   python bench/circusd.py --watchers 1000 --pids 4 --latency 0.001
+#
+# NOTES
+#
+#   [F1] Watchers are named "group<G>-watcher<I>", ten to a group, so names
+#   can be split on "-" like Circus namespaces. Every tenth watcher is a
+#   singleton, with a single process.
+#
+#   [F2] Stats are published at "--rate" messages per second, in small
+#   batches, cycling through the topics. A round has a "stat.<watcher>"
+#   message per watcher and a "stat.<watcher>.<pid>" message per process,
+#   like the Circus stats streamer.
+#
+
+# Python.
+from json import loads, dumps
+from time import time
+from random import random
+from fnmatch import fnmatchcase
+from argparse import ArgumentParser
+from collections import OrderedDict
+from asyncio import sleep, get_event_loop, new_event_loop, set_event_loop
+
+# Libs.
+from zmq import ROUTER, PUB
+from aiozmq import ZmqProtocol, create_zmq_connection
+
+# Default control endpoint. Pub/sub and stats are on the next two ports.
+_CONTROL_ADDR = 'tcp://127.0.0.1:5555'
+
+# Commands that accept a glob for the watcher name.
+_GLOB_COMMANDS = ('start', 'stop', 'restart')
+
+# Seconds between two batches of stats messages. See [F2].
+_TICK = 0.01
+
+class _ControlProtocol(ZmqProtocol):
+    def __init__(self, circus):
+        self._circus = circus
+
+    def msg_received(self, message):
+        identity, msg = message
+
+        self._circus.handle(identity, loads(msg.decode()))
+
+class _Watcher:
+    '''A watcher without processes.'''
+
+    __slots__ = ('name', 'singleton', 'state', 'pids')
+
+    def __init__(self, name, singleton):
+        self.name = name
+        self.singleton = singleton
+        self.state = 'active'
+        self.pids = []
+
+class _FakeCircus:
+    '''Answers control requests, publishes stats and events. See [F1].'''
+
+    def __init__(self, watchers, pids, latency, rate):
+        self._latency = latency
+        self._rate = rate
+        self._watchers = OrderedDict()
+        self._next_pid = 1000
+        self._topics = None
+        self._control = self._stats = self._pubsub = None
+
+        # Counters.
+        self.requests = self.published = 0
+
+        for i in range(watchers):
+            name = 'group{}-watcher{}'.format(i // 10, i)
+            watcher = _Watcher(name, i % 10 == 0)
+
+            for j in range(1 if watcher.singleton else pids):
+                watcher.pids.append(self._spawn())
+
+            self._watchers[name] = watcher
+
+    async def bind(self, control, stats, pubsub):
+        self._control, __ = await create_zmq_connection(
+            lambda: _ControlProtocol(self), ROUTER, bind=control)
+
+        self._stats, __ = await create_zmq_connection(
+            ZmqProtocol, PUB, bind=stats)
+
+        self._pubsub, __ = await create_zmq_connection(
+            ZmqProtocol, PUB, bind=pubsub)
+
+    async def publish(self):  # See [F2].
+        batch = max(1, int(self._rate * _TICK))
+        i = 0
+
+        while True:
+            if self._topics is None:
+                self._topics = []
+
+                for w in self._watchers.values():
+                    if w.state == 'active':
+                        self._topics.append((w, None))
+                        self._topics.extend((w, x) for x in w.pids)
+
+            for j in range(batch if self._topics else 0):
+                watcher, pid = self._topics[i % len(self._topics)]
+                stats = {'cpu': round(random() * 10, 1),
+                         'mem': round(random() * 2, 1)}
+
+                if pid is None:
+                    topic = 'stat.{}'.format(watcher.name)
+                    stats['pid'] = watcher.pids
+
+                else:
+                    topic = 'stat.{}.{}'.format(watcher.name, pid)
+
+                self._stats.write([topic.encode(), dumps(stats).encode()])
+
+                self.published += 1
+
+                i += 1
+
+            await sleep(_TICK)
+
+    def handle(self, identity, query):
+        self.requests += 1
+
+        reply = self._reply(query)
+        reply['id'] = query.get('id')
+        reply['time'] = time()
+
+        message = [identity, dumps(reply).encode()]
+
+        if self._latency:
+            get_event_loop().call_later(self._latency, self._control.write,
+                                        message)
+
+        else:
+            self._control.write(message)
+
+    def _reply(self, query):
+        command = query.get('command')
+        properties = query.get('properties', {})
+        name = properties.get('name')
+        watcher = self._watchers.get(name)
+
+        if command in _GLOB_COMMANDS and properties.get('match') == 'glob':
+            watchers = [x for x in self._watchers.values()
+                        if fnmatchcase(x.name, name)]
+
+            for x in watchers:
+                getattr(self, '_' + command)(x)
+
+            self._topics = None
+
+            if watchers:
+                return {'status': 'ok'}
+
+        if name and watcher is None:
+            return {'status': 'error', 'reason': 'program not found'}
+
+        if command == 'list':
+            return {'status': 'ok', 'watchers': list(self._watchers)}
+
+        elif command == 'options' and watcher:
+            return {'status': 'ok', 'options': {
+                'singleton': watcher.singleton, 'forget': '',
+                'numprocesses': len(watcher.pids)}}
+
+        elif command == 'status' and watcher:
+            return {'status': watcher.state}
+
+        elif command == 'status':
+            return {'status': 'ok', 'statuses': {
+                x.name: x.state for x in self._watchers.values()}}
+
+        elif command == 'stats' and watcher:
+            return {'status': 'ok', 'info': self._info(watcher)}
+
+        elif command == 'stats':
+            return {'status': 'ok', 'infos': {
+                x.name: self._info(x) for x in self._watchers.values()}}
+
+        elif command in ('incr', 'decr') and watcher:
+            for i in range(properties.get('nb', 1)):
+                getattr(self, '_' + command)(watcher)
+
+            self._topics = None
+
+            return {'status': 'ok', 'numprocesses': len(watcher.pids)}
+
+        elif command in _GLOB_COMMANDS and watcher:
+            getattr(self, '_' + command)(watcher)
+
+            self._topics = None
+
+            return {'status': 'ok', 'numprocesses': len(watcher.pids)}
+
+        elif command == 'signal' and watcher:
+            if properties.get('pid', None) not in watcher.pids + [None]:
+                return {'status': 'error', 'reason': 'process not found'}
+
+            return {'status': 'ok'}
+
+        else:
+            return {'status': 'error', 'reason': 'unknown command'}
+
+    def _info(self, watcher):
+        return {str(x): {'pid': x, 'cpu': 0.0, 'mem': 0.0}
+                for x in watcher.pids}
+
+    def _spawn(self):
+        self._next_pid += 1
+
+        return self._next_pid
+
+    def _event(self, watcher, event, pid=None):
+        msg = {'time': time()}
+
+        if pid is not None:
+            msg['process_pid'] = pid
+
+        topic = 'watcher.{}.{}'.format(watcher.name, event)
+
+        self._pubsub.write([topic.encode(), dumps(msg).encode()])
+
+    def _start(self, watcher):
+        if watcher.state != 'active':
+            watcher.state = 'active'
+            watcher.pids = [self._spawn()]
+
+            self._event(watcher, 'start')
+            self._event(watcher, 'spawn', watcher.pids[0])
+
+    def _stop(self, watcher):
+        if watcher.state == 'active':
+            for pid in watcher.pids:
+                self._event(watcher, 'kill', pid)
+
+            watcher.state = 'stopped'
+            watcher.pids = []
+
+            self._event(watcher, 'stop')
+
+    def _restart(self, watcher):
+        self._stop(watcher)
+        self._start(watcher)
+
+    def _incr(self, watcher):
+        watcher.pids.append(self._spawn())
+
+        self._event(watcher, 'spawn', watcher.pids[-1])
+
+    def _decr(self, watcher):
+        if watcher.pids:
+            self._event(watcher, 'kill', watcher.pids.pop())
+
+def _arguments(argv=None):
+    '''Parse the command line.'''
+
+    parser = ArgumentParser(description='A stand-in for circusd.')
+
+    parser.add_argument('--watchers', type=int, default=100,
+                        help='number of watchers (default: 100)')
+    parser.add_argument('--pids', type=int, default=2,
+                        help='processes per watcher (default: 2)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds before each reply (default: 0)')
+    parser.add_argument('--rate', type=int, default=1000,
+                        help='stats messages per second (default: 1000)')
+    parser.add_argument('--control', default=_CONTROL_ADDR,
+                        help='control endpoint (default: {})'.format(
+                            _CONTROL_ADDR))
+    parser.add_argument('--stats', help='stats endpoint')
+    parser.add_argument('--pubsub', help='pub/sub endpoint')
+
+    args = parser.parse_args(argv)
+    prefix, __, port = args.control.rpartition(':')
+
+    if args.stats is None or args.pubsub is None:
+        if not args.control.startswith('tcp://') or not port.isdigit():
+            parser.error('--stats and --pubsub are required for {}'.format(
+                args.control))
+
+        args.stats = args.stats or '{}:{}'.format(prefix, int(port) + 2)
+        args.pubsub = args.pubsub or '{}:{}'.format(prefix, int(port) + 1)
+
+    return args
+
+def main():
+    args = _arguments()
+    loop = new_event_loop()
+
+    set_event_loop(loop)
+    circus = _FakeCircus(args.watchers, args.pids, args.latency, args.rate)
+
+    loop.run_until_complete(circus.bind(args.control, args.stats,
+                                        args.pubsub))
+
+    # Tell a parent process that the sockets are bound.
+    print('ready', flush=True)
+
+    try:
+        loop.run_until_complete(circus.publish())
+
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
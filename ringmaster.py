@@ -16,28 +16,42 @@
 #
 # NOTES
 #
-#   [LEAK] This program has a memory leak in OS X. Memory consumption increases
-#   over time, and is proportional to the frequency of invocation of methods
-#   "_update_watcher_state_a" and "_update_watcher_state_b" of the application
-#   class, which only perform Tkinter operations. This leads me to believe that
-#   the problem is either in Tcl/Tk, or Tkinter itself.
+#   [C2] Modules that the first frame does not need (dialogs, the config file
+#   parser, memory maps) are imported where they are used. See [C1].
 #
-#     http://stackoverflow.com/questions/22143622
-#
-#   [LEAK2] Test if a watcher's process list has changed before calling the
-#   "_update_watcher_state_a" method. This will mitigate memory leakage.
+#   [C3] The Tcl/Tk window lives in module "ringmaster_tk", which "main"
+#   imports for the window mode only. The headless and terminal modes run on
+#   a Python without tkinter, as found on most servers. The terminal imports
+#   curses on start, see "_Terminal". Since "ringmaster_tk" imports this
+#   module as "ringmaster", a script run hands over to that module, so that
+#   the classes are not defined twice, once in "__main__".
 #
 
 # Python.
-from os import kill
+from os import environ, get_terminal_size, makedirs, remove, replace
+from os.path import expanduser, isfile, join
+from struct import Struct
+from signal import SIGINT, SIGTERM
+from math import inf, nan
+from array import array
+from bisect import bisect_left, bisect_right
 from uuid import uuid4
-from json import loads, dumps
-from asyncio import Future, async, coroutine, sleep, get_event_loop
-from tkinter import Toplevel, TclError, Tk, ttk, font, messagebox
+from json import load, loads, dump, dumps
+from time import monotonic, time
+from fnmatch import fnmatchcase
+from argparse import ArgumentParser
+from subprocess import DEVNULL
+from collections import OrderedDict, deque
+from asyncio import Future, Semaphore, SelectorEventLoop, TimeoutError, \
+    create_subprocess_shell, ensure_future, gather, sleep, start_server, \
+    wait, wait_for, get_event_loop, new_event_loop, set_event_loop, \
+    set_event_loop_policy
 from functools import partial
+from threading import Lock, Thread
 
 # Libs.
-from zmq import SUB, DEALER, IDENTITY, LINGER
+from zmq import SUB, DEALER, IDENTITY, LINGER, EVENT_CONNECTED, \
+    EVENT_DISCONNECTED
 from aiozmq import ZmqProtocol, create_zmq_connection
 
 # The Circus stats streamer SUB address.
@@ -46,6 +60,132 @@ _CIRCUS_STATS_ADDR = 'tcp://127.0.0.1:5557'
 # The Circus control REP address.
 _CIRCUS_CONTROL_ADDR = 'tcp://127.0.0.1:5555'
 
+# The Circus pub/sub (watcher events) PUB address.
+_CIRCUS_PUBSUB_ADDR = 'tcp://127.0.0.1:5556'
+
+# Default TCP ports of the pub/sub and stats endpoints, relative to the port of
+# the control endpoint. These are the defaults of Circus.
+_PUBSUB_PORT_OFFSET = 1
+_STATS_PORT_OFFSET = 2
+
+# Seconds between polls of the control socket.
+_POLL_INTERVAL = 0.5
+
+# Seconds between reconciliation polls, while the pub/sub stream is up.
+_RECONCILE_INTERVAL = 10.0
+
+# Maximum number of requests in flight on a single control socket.
+_MAX_IN_FLIGHT = 64
+
+# Seconds to wait for the reply to a control request.
+_REQUEST_TIMEOUT = 3.0
+
+# Consecutive requests without a reply that mark Circus as unreachable.
+_BREAKER_THRESHOLD = 3
+
+# Bounds, in seconds, of the delay before Circus is tried again.
+_BACKOFF_MIN = 0.5
+_BACKOFF_MAX = 30.0
+
+# Poll the whole fleet with bulk "status" and "stats" requests. When false,
+# every watcher is polled with its own pair of requests.
+_BULK_POLLING = True
+
+# Upper bound of watcher row render passes per second.
+_FRAME_RATE = 25
+
+# Bounds, in seconds, of the interval between two runs of the Tk event loop,
+# where Tk is polled. Input waits for one frame at most, however idle the
+# window was. Elsewhere an idle window waits in Tk, and does not poll.
+_TK_INTERVAL_MIN = 0.005
+_TK_INTERVAL_MAX = 1 / _FRAME_RATE
+
+# Maximum number of watcher events waiting for the main thread. See [Q1].
+_DELTA_EVENTS = 10000
+
+# Directory of the fleet snapshots, one per daemon. See [C1].
+_CACHE_DIR = join(environ.get('XDG_CACHE_HOME') or expanduser('~/.cache'),
+                  'ringmaster')
+
+# Seconds between two snapshots of a daemon.
+_CACHE_INTERVAL = 60.0
+
+# Maximum number of concurrent "options" queries at startup.
+_DISCOVERY_FAN_OUT = 32
+
+# Number of watcher rows shown when the window opens.
+_VISIBLE_ROWS = 25
+
+# Seconds between two sorts of the watcher list, when sorted by a stat. Rows
+# do not jump around on every stats message.
+_RESORT_INTERVAL = 1.0
+
+# History of each watcher. Resolution (in seconds) and number of samples of
+# each tier, finest first. Samples are averaged from one tier into the next.
+_HISTORY = ((1, 600), (60, 1440))
+
+# Keep the history of each process too, from the per process stats, by
+# default. See "--pid-history".
+_PID_HISTORY = False
+
+# Number of rows of the process table, in the details dialog.
+_PROCESS_ROWS = 12
+
+# Number of samples, and size in pixels, of the sparkline of a watcher row.
+_SPARK_SAMPLES = 60
+_SPARK_SIZE = (60, 16)
+
+# Default address of the metrics HTTP endpoint, in headless mode.
+_METRICS_ADDR = '127.0.0.1:9101'
+
+# Metric families exported in headless mode. Names, types and help texts.
+_METRICS = [
+    ('circus_daemon_up', 'gauge', 'Whether the daemon replies to requests.'),
+    ('circus_watcher_up', 'gauge', 'Whether the watcher is active.'),
+    ('circus_watcher_processes', 'gauge', 'Number of processes.'),
+    ('circus_watcher_cpu_ratio', 'gauge', 'CPU usage of all processes.'),
+    ('circus_watcher_memory_ratio', 'gauge', 'Memory usage of all processes.'),
+    ('circus_process_cpu_ratio', 'gauge', 'CPU usage of a process.'),
+    ('circus_process_memory_ratio', 'gauge', 'Memory usage of a process.'),
+    ('circus_watcher_alert', 'gauge', 'Whether an alert rule is firing.'),
+]
+
+# Process table sort orders. Labels, and keys of a (pid, cpu, mem) sample.
+_PROCESS_SORTS = [
+    ('PID', lambda p: p[0]),
+    ('CPU', lambda p: (-(p[1] or 0), p[0])),
+    ('Memory', lambda p: (-(p[2] or 0), p[0])),
+]
+
+# Circus commands that take a glob for the watcher name.
+_GLOB_ACTIONS = ('start', 'stop', 'restart')
+
+# Upper bounds, in seconds, of the buckets of duration histograms. From 100
+# microseconds to 13 seconds, doubling. See [T1].
+_BUCKETS = tuple(0.0001 * 2 ** x for x in range(18))
+
+# Seconds between two refreshes of the diagnostics window.
+_DIAGNOSTICS_INTERVAL = 1.0
+
+# Size in bytes, and number, of the files of a recording. See [X1].
+_RECORD_SIZE = 64 * 1024 * 1024
+_RECORD_FILES = 10
+
+# Seconds between two flushes of recorded messages to disk.
+_RECORD_FLUSH = 1.0
+
+# Records fed between two iterations of the event loop, in fast replay.
+_REPLAY_BATCH = 1000
+
+# First line of a recording file.
+_RECORD_MAGIC = b'RINGMASTER RECORDING 1\n'
+
+# Record header. Wall time, kind, daemon index, topic and message sizes.
+_RECORD = Struct('<dBHHI')
+
+# Record kinds.
+_RECORD_STATS, _RECORD_EVENT, _RECORD_REQUEST, _RECORD_REPLY = range(4)
+
 # Main window title.
 _TITLE = 'Circus Ringmaster'
 
@@ -55,570 +195,3171 @@ _SIGNALS = ['HUP', 'INT', 'QUIT', 'KILL', 'TERM', 'USR1', 'USR2']
 # Helper to format watcher names.
 _DOT = lambda x: x.replace('-', '.')
 
+# Watcher list sort orders. Labels, and keys of a watcher state.
+_SORTS = [
+    ('Name', lambda w: w.watcher),
+    ('CPU', lambda w: (-(w.cpu or 0), w.watcher)),
+    ('Memory', lambda w: (-(w.mem or 0), w.watcher)),
+    ('Processes', lambda w: (-w.procs, w.watcher)),
+]
+
+# Show the watcher list as a tree of namespaces, when the window opens.
+_NAMESPACE_TREE = True
+
+# Default alert rules. Names, metrics, thresholds, clear thresholds, and
+# seconds above the threshold before an alert fires. See [L1].
+_ALERTS = [
+    ('cpu', 'cpu', 0.9, 0.8, 30),
+    ('memory', 'mem', 0.5, 0.45, 0),
+    ('processes', 'missing', 0, 0, 10),
+    ('flapping', 'spawns', 5, 2, 0),
+]
+
+# Alert metrics. See [L2].
+_ALERT_METRICS = ('cpu', 'mem', 'missing', 'spawns')
+
+# Seconds of spawn events counted by the "spawns" alert metric.
+_FLAPPING_WINDOW = 60.0
+
+# Maximum number of alert hook commands running at a time. See [L3].
+_HOOK_FAN_OUT = 4
+
+# Number of lines of the alert list, in the main window.
+_ALERT_ROWS = 5
+
+# Event loop implementations. See [Y2].
+_LOOPS = ('asyncio', 'uvloop')
+
+# Render passes per second in the terminal. Fewer than in the window, to save
+# bandwidth over slow links. See [U2].
+_TUI_FRAME_RATE = 5
+
+# Columns of the terminal table. Titles, widths (0 takes the width left), text
+# alignments, and the "_SORTS" labels of the columns. The width of the first
+# follows the longest watcher name.
+_TUI_COLUMNS = [
+    ('Watcher', 0, '<', 'Name'),
+    ('State', 8, '<', None),
+    ('Procs', 6, '>', 'Processes'),
+    ('CPU', 7, '>', 'CPU'),
+    ('Memory', 7, '>', 'Memory'),
+    ('Alerts', 0, '<', None),
+]
+
+# Key bindings, on the status line of the terminal.
+_TUI_HELP = 'j/k move  +/- incr/decr  s start  x stop  </> sort  q quit'
+
+# NOTES
+#
+#   [T1] Histograms have fixed buckets. Recording a duration costs a
+#   bisection and a few additions, so instrumentation is always on, in the
+#   hot paths too. Quantiles are estimated as the upper bound of the bucket
+#   they fall in (or the maximum, if lower).
+#
+class _Histogram:
+    '''Distribution of durations, in seconds. See [T1].'''
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        seen = 0
+
+        for i, n in enumerate(self.counts):
+            seen += n
+
+            if n and seen >= q * self.count:
+                return min(_BUCKETS[i], self.max) if i < len(_BUCKETS) \
+                    else self.max
+
+        return 0.0
+
+    def summary(self):
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.quantile(0.5), 'p90': self.quantile(0.9),
+                'p99': self.quantile(0.99), 'max': self.max}
+
+# NOTES
+#
+#   [I1] Topics are "stat.<watcher>" (aggregated), "stat.<watcher>.<pid>",
+#   "stat.sockets" and "stat.sockets.<fd>". Only the first kind is of use
+#   (and the second, while a details dialog is open or with per process
+#   history, see "_per_pid"), and is
+#   recognized on the raw topic. Other messages are dropped before they are
+#   decoded. Messages are not decoded as they arrive either. The latest one
+#   of each topic is kept, and those are decoded once per iteration of the
+#   event loop of the ingest thread, and handed to the main thread (see
+#   [Q1]).
+#
+def _sockets_topic(topic):
+    '''Whether a raw stats topic is of the Circus sockets. Watchers may be
+    named like "sockets-proxy".'''
+
+    return topic == b'stat.sockets' or topic.startswith(b'stat.sockets.')
+
 class _CircusSubProtocol(ZmqProtocol):
-    def __init__(self, application):
+    def __init__(self, application, daemon):
         self._app = application
+        self._daemon = daemon
+        self._latest = {}
+        self._window = (monotonic(), 0)
 
-    def msg_received(self, message):
+        # Counters.
+        self.received = self.dropped = self.coalesced = self.decoded = 0
+        self.rate = 0.0
+        self.durations = _Histogram()
+
+    def msg_received(self, message, when=None):  # See [I1].
+        topic, msg = message
+        when = monotonic() if when is None else when  # See [X4].
+
+        self.received += 1
+
+        if self._daemon.record:  # See [X1].
+            self._daemon.record(_RECORD_STATS, topic, msg)
+
+        dots = topic.count(b'.')
+
+        if _sockets_topic(topic) or not (
+                dots == 1 or dots == 2 and self._app._per_pid):
+            self.dropped += 1
+
+        elif topic in self._latest:
+            self.coalesced += 1
+
+            self._latest[topic] = (when, msg)
+
+        else:
+            if not self._latest:
+                get_event_loop().call_soon(self._drain)
+
+            self._latest[topic] = (when, msg)
+
+    def _drain(self):
+        latest, self._latest = self._latest, {}
+        start = monotonic()
+        batch = {}
+
+        for topic, (when, msg) in latest.items():
+            name, __, pid = topic[5:].decode().partition('.')
+            msg = loads(msg.decode())
+
+            self.decoded += 1
+
+            if pid or 'pid' in msg:
+                batch[self._daemon.key(name), int(pid) if pid else None] = \
+                    when, msg
+
+        self._daemon.deltas.stats(batch)
+
+        self.durations.observe(monotonic() - start)
+
+        start, received = self._window
+
+        if monotonic() - start >= 1:
+            self.rate = (self.received - received) / (monotonic() - start)
+
+            self._window = (monotonic(), self.received)
+
+    def counters(self):
+        return {'received': self.received, 'dropped': self.dropped,
+                'coalesced': self.coalesced, 'decoded': self.decoded,
+                'received_per_second': self.rate,
+                'queued': len(self._latest)}
+
+# Topics are "watcher.<name>.<event>", see "Watcher.notify_event" in Circus.
+# The connection state of the socket tells the application whether it may
+# rely on the stream, or has to fall back to fast polling. Runs on the ingest
+# thread, like "_CircusSubProtocol", see [Q1].
+class _CircusEventProtocol(ZmqProtocol):
+    def __init__(self, application, daemon):
+        self._app = application
+        self._daemon = daemon
+        self.durations = _Histogram()
+
+    def msg_received(self, message, when=None):
+        start = monotonic()
         topic, msg = message
+        when = start if when is None else when  # See [X4].
+
+        if self._daemon.record:  # See [X1].
+            self._daemon.record(_RECORD_EVENT, topic, msg)
+
         pre, topic = topic.decode().split('.', 1)
+        name, event = topic.rsplit('.', 1)
+        name = self._daemon.key(name)
+
+        self._daemon.deltas.event(when, name, event, loads(msg.decode()))
+
+        self.durations.observe(monotonic() - start)
 
-        msg = loads(msg.decode())
+    def event_received(self, event):
+        if event.event == EVENT_CONNECTED:
+            self._daemon.deltas.connected(True)
 
-        if '.' not in topic and 'pid' in msg:
-            self._app._update_watcher_state_b(topic, msg)
+        elif event.event == EVENT_DISCONNECTED:
+            self._daemon.deltas.connected(False)
 
 class _CircusDealerProtocol(ZmqProtocol):
-    def __init__(self, application, attr_name):
-        self._app = application
-        self._rep = attr_name
+    def __init__(self, multiplexer):
+        self._mux = multiplexer
 
     def msg_received(self, message):
-        getattr(self._app, self._rep).set_result(loads(message[0].decode()))
+        self._mux.reply_received(loads(message[0].decode()))
+
+class _Unreachable(Exception):
+    '''Circus is not replying to control requests.'''
 
-class _Dialog(Toplevel):
-    '''Watcher details dialog.'''
+# NOTES
+#
+#   [M1] Circus echoes the "id" field of a request in its reply. A DEALER
+#   socket does not enforce the strict send/receive alternation of REQ, so
+#   many requests may be written before the first reply is read, and the
+#   replies are matched to their callers by that id.
+#
+#   [M2] A reply whose id is not pending belongs to a caller that is gone
+#   (for example, a request that timed out). It is silently dropped.
+#
+#   [M3] Every request has a deadline. Once "_BREAKER_THRESHOLD" requests in
+#   a row miss theirs, the breaker opens: requests fail right away (those
+#   in flight, and those waiting for a slot, too), and the socket is
+#   replaced with a fresh one, which drops whatever was queued for the old
+#   peer. After a backoff delay, requests go through again. A reply
+#   closes the breaker, another timeout opens it for twice as long, up to
+#   "_BACKOFF_MAX".
+#
+class _CircusMultiplexer:
+    '''Pipelined, id-correlated requests over a Circus DEALER socket.'''
 
-    def __init__(self, parent, watcher):
-        super().__init__(parent)
+    def __init__(self, endpoint, listener, spawn, limit=_MAX_IN_FLIGHT):
+        self._endpoint = endpoint
+        self._listener = listener
+        self._spawn = spawn
+        self._transport = None
+        self._pending = {}
+        self._slots = Semaphore(limit)
+        self._failures = 0
+        self._backoff = _BACKOFF_MIN
+        self._until = 0
+        self._connecting = None
 
-        self._parent = parent
-        self._watcher = watcher
-        self._painter = self._paint()
+        self.reachable = True
 
-        self._painter.send(None)
+        # Counters, and round trip durations by command.
+        self.waiting = self.timeouts = 0
+        self.latency = {}
 
-        # Need to call "self.update_idletasks" before "self._center".
-        self.update_idletasks()
+    async def connect(self):
+        factory = lambda: _CircusDealerProtocol(self)
 
-        # Center the dialog within the application window.
-        self.geometry('+{}+{}'.format(*self._center()))
+        if self._transport:
+            self._transport.close()
 
-        # Disable resizing.
-        self.resizable(False, False)
+        self._transport, _ = await create_zmq_connection(factory, DEALER)
 
-        # Make sure an explicit close is handled by "self._close".
-        self.protocol('WM_DELETE_WINDOW', self._close)
+        self._transport.setsockopt(LINGER, 0)
+        self._transport.setsockopt(IDENTITY, uuid4().hex.encode())
+        self._transport.connect(self._endpoint)
 
-        # Make sure the Escape key will trigger "self._close".
-        self.bind('<Escape>', self._close)
+    def close(self):
+        if self._connecting:
+            self._connecting.cancel()
 
-        # Set transient (no icon in the window manager, etc).
-        self.transient(parent)
+        if self._transport:
+            self._transport.close()
 
-        # Set modal – takes all input from all other windows.
-        self.grab_set()
+        self._transport = None
 
-        # Focus on the dialog itself.
-        self.focus_set()
+    async def request(self, query, timeout=_REQUEST_TIMEOUT):
+        '''Send a query and wait for the matching reply. See [M1].'''
 
-    def _paint(self):
-        outer = ttk.Frame(self, padding=(10, 10, 10, 10))
-        title = ttk.Label(outer, text='+ ' + _DOT(self._watcher))
-        close = ttk.Button(outer, text='Close', command=self._close)
-        frame = ttk.Frame(outer)
-        drawn = []
+        self._check()
 
-        self.title('')
+        self.waiting += 1
 
-        outer.grid(row=0, column=0, sticky='NSEW')
-        title.grid(row=0, column=0, pady=(0, 10))
-        frame.grid(row=1, column=0, sticky='EW')
-        close.grid(row=2, column=0, sticky='EW', pady=(10, 0))
+        try:
+            await self._slots.acquire()
 
-        title.config(font='-size 16')
-        frame.columnconfigure(0, weight=1)
+        finally:
+            self.waiting -= 1
 
-        while self._parent._running:
-            procs = self._parent._frame.children[self._watcher + '+l']._w_procs
+        # The breaker may have opened while waiting for the slot.
+        try:
+            self._check()
 
-            for x in frame.grid_slaves():
-                if x._pid not in procs:
-                    x.config(state='disabled')
+        except _Unreachable:
+            self._slots.release()
 
-                    if int(x.grid_info()['row']) > 0:
-                        x.unbind('<Button-1>')
+            raise
 
-            for j, pid in enumerate(procs, len(drawn)):
-                if pid not in drawn:
-                    lbl = ttk.Label(frame, text=pid, style='X.TLabel')
+        try:
+            future = self._pending[query['id']] = Future()
+            start = monotonic()
 
-                    lbl.grid(row=0, column=j)
+            self._transport.write([dumps(query).encode()])
 
-                    lbl._pid = pid
+            reply = await wait_for(future, timeout)
 
-                    for i, x in enumerate(_SIGNALS):
-                        btn = ttk.Button(frame, text=x)
+            if query['command'] not in self.latency:
+                self.latency[query['command']] = _Histogram()
 
-                        btn.grid(row=i + 1, column=j)
+            self.latency[query['command']].observe(monotonic() - start)
 
-                        btn.bind('<Button-1>', partial(self._signal, x, pid))
+        except TimeoutError:
+            self.timeouts += 1
 
-                        btn._pid = pid
+            self._failed()
 
-                    drawn.append(pid)
+            raise
 
-            yield
+        finally:
+            del self._pending[query['id']]
 
-    def _close(self, event=None):
-        self._parent._toplevel = None
+            self._slots.release()
 
-        self._parent.focus_set()
+        self._succeeded()
 
-        self._painter.close()
+        return reply
 
-        self.destroy()
+    def reply_received(self, reply):
+        future = self._pending.get(reply.get('id'))
 
-    def _center(self):
-        w = self.winfo_width()
-        h = self.winfo_height()
-        x = self._parent.winfo_width() // 2 - w // 2
-        y = self._parent.winfo_height() // 2 - h // 2
+        if future is not None and not future.done():  # See [M2].
+            future.set_result(reply)
 
-        return self._parent.winfo_rootx() + x, self._parent.winfo_rooty() + y
+    def counters(self):
+        return {'in_flight': len(self._pending), 'waiting': self.waiting,
+                'timeouts': self.timeouts, 'reachable': self.reachable}
 
-    def _signal(self, signame, pid, event):
-        import signal
+    def _check(self):  # See [M3].
+        if self._transport is None or monotonic() < self._until:
+            raise _Unreachable()
 
-        try:
-            caption = _DOT(self._watcher)
-            message = 'Sent SIG{} to {}.'.format(signame, pid)
+    def _failed(self):
+        self._failures += 1
 
-            # Circus might restart the process if it is killed by the signal.
-            kill(pid, getattr(signal, 'SIG' + signame))
+        if self._failures >= _BREAKER_THRESHOLD and monotonic() >= self._until:
+            self._until = monotonic() + self._backoff
+            self._backoff = min(self._backoff * 2, _BACKOFF_MAX)
 
-            messagebox.showinfo(caption, message)
+            self._reachable(False)
 
-        except ProcessLookupError:
-            pass
+            # Replies to the old socket will not come.
+            for x in self._pending.values():
+                if not x.done():
+                    x.set_exception(_Unreachable())
+
+            # A task of the monitor, cancelled on shutdown. See [Y1].
+            self._connecting = self._spawn(self.connect())
+
+    def _succeeded(self):
+        self._failures = 0
+        self._backoff = _BACKOFF_MIN
+
+        self._reachable(True)
+
+    def _reachable(self, reachable):
+        if reachable != self.reachable:
+            self.reachable = reachable
+
+            self._listener()
+
+def _endpoints(control):
+    '''Default stats and pub/sub endpoints for a control endpoint.'''
+
+    scheme, __, address = control.partition('://')
+    host, __, port = address.rpartition(':')
+
+    if scheme == 'tcp' and port.isdigit():
+        stats = 'tcp://{}:{}'.format(host, int(port) + _STATS_PORT_OFFSET)
+        pubsub = 'tcp://{}:{}'.format(host, int(port) + _PUBSUB_PORT_OFFSET)
+
+        return stats, pubsub
+
+    else:
+        return None, None
 
 # NOTES
 #
-#  [A1] Use this customizable font for the entire GUI.
+#   [N1] Each daemon has a connection set of its own: a SUB socket for the
+#   stats stream, another for the pub/sub stream, and two multiplexed DEALER
+#   sockets for control requests. Watchers are keyed by daemon and name (see
+#   "key"), so that equally named watchers of different daemons do not mix.
+#   The streams are optional; without them, the daemon is only polled.
+#
+class _Daemon:
+    '''Connections to a Circus daemon. See [N1].'''
+
+    def __init__(self, name, control, stats, pubsub, listener, spawn):
+        self.name = name
+        self.control = control
+        self.stats = stats
+        self.pubsub = pubsub
+        self.mux1 = _CircusMultiplexer(control, listener, spawn)
+        self.mux2 = _CircusMultiplexer(control, listener, spawn)
+        self.sub = self.ingest = self.evt = self.feed = None
+        self.deltas = _Deltas()
+        self.record = None
+        self.events = False
+        self.synced = False
+        self.forgotten = set()
+        self.watchers = set()
+
+    @property
+    def reachable(self):
+        return self.mux1.reachable and self.mux2.reachable
+
+    def key(self, watcher):
+        return self.name + '/' + watcher
+
+    def protocols(self, application):
+        if self.stats:
+            self.ingest = _CircusSubProtocol(application, self)
+
+        if self.pubsub:
+            self.feed = _CircusEventProtocol(application, self)
+
+    async def connect(self):
+        await self.mux1.connect()
+        await self.mux2.connect()
+
+    async def subscribe(self):  # See [Q1].
+        factory1 = lambda: self.ingest
+        factory2 = lambda: self.feed
+
+        if self.ingest:
+            self.sub, __ = await create_zmq_connection(factory1, SUB)
+
+            self.sub.subscribe(b'stat.')
+            self.sub.connect(self.stats)
+
+        if self.feed:
+            self.evt, __ = await create_zmq_connection(factory2, SUB)
+
+            await self.evt.enable_monitor()
+
+            self.evt.subscribe(b'watcher.')
+            self.evt.connect(self.pubsub)
+
+    def unsubscribe(self):
+        for x in (self.sub, self.evt):
+            if x is not None:
+                x.close()
+
+        self.sub = self.evt = None
+
+    def close(self):
+        self.mux1.close()
+        self.mux2.close()
+
+# NOTES
 #
-#    http://stackoverflow.com/a/4073037
+#   [Q1] The stream sockets belong to the ingest thread, which runs an event
+#   loop of its own. It reads, filters, coalesces and decodes messages (see
+#   [I1]), and hands the results to a "_Deltas" of the daemon: the latest stats
+#   of each watcher and process, and the events in order. When a hand-off stops
+#   being empty, the main thread is woken, and takes them at most once per
+#   frame, and applies them to the store. Without messages, the main thread is
+#   not woken at all. The hand-off is bounded: stats are coalesced by topic
+#   while the main thread is busy, and only the last "_DELTA_EVENTS" events are
+#   kept (missed ones are caught up by polling, see [D1]). A slow redraw, or a
+#   modal dialog, delays the application of deltas, but not ingest. Tk releases
+#   the GIL while it waits for events. Control sockets stay on the main thread,
+#   with the coroutines that wait for their replies.
 #
-#  [A2] This will make Command+Q quit the Tk application.
+#   [Q2] Stats and events come from two sockets, and are taken apart, so the
+#   order they were read in is kept as the time each was read at. Events are
+#   applied first. A sample read before the last event of its watcher (like
+#   the sample of a process that was just stopped) is stale, and dropped.
 #
-#    http://mail.python.org/pipermail/tkinter-discuss/2009-April/001900.html.
+class _Deltas:
+    '''Coalescing hand-off of decoded stream messages. See [Q1].'''
+
+    def __init__(self, limit=_DELTA_EVENTS):
+        self._lock = Lock()
+        self._limit = limit
+        self._stats = {}
+        self._events = deque(maxlen=limit)
+        self._connected = None
+        self._pending = False
+        self._listener = None
+
+        # Counters.
+        self.coalesced = self.dropped = 0
+
+    def stats(self, batch):
+        '''Times read and stats, by (watcher, pid). The pid of a watcher is
+        None.'''
+
+        with self._lock:
+            self.coalesced += len(self._stats.keys() & batch.keys())
+
+            self._stats.update(batch)
+
+            self._ready()
+
+    def event(self, when, name, event, msg):
+        with self._lock:
+            if len(self._events) == self._limit:
+                self.dropped += 1
+
+            self._events.append((when, name, event, msg))
+
+            self._ready()
+
+    def connected(self, connected):
+        with self._lock:
+            self._connected = connected
+
+            self._ready()
+
+    def listen(self, listener):
+        '''Call "listener", from the feeding thread, whenever the hand-off
+        stops being empty.'''
+
+        self._listener = listener
+
+    def _ready(self):
+        if not self._pending:
+            self._pending = True
+
+            if self._listener is not None:
+                self._listener()
+
+    def take(self):
+        '''Return, and clear, the connection state, events and stats.'''
+
+        with self._lock:
+            taken = self._connected, self._events, self._stats
+
+            self._pending = False
+            self._connected = None
+            self._events = deque(maxlen=self._limit)
+            self._stats = {}
+
+        return taken
+
+    def counters(self):
+        return {'pending': len(self._stats) + len(self._events),
+                'coalesced': self.coalesced, 'dropped': self.dropped}
+
+class _Ingest(Thread):
+    '''Owns the stream sockets of every daemon. See [Q1].'''
+
+    def __init__(self, daemons):
+        super().__init__(name='ingest', daemon=True)
+
+        self._daemons = daemons
+        self._loop = new_event_loop()
+
+    def run(self):
+        set_event_loop(self._loop)
+
+        self._loop.run_until_complete(
+            gather(*[x.subscribe() for x in self._daemons]))
+        self._loop.run_forever()
+
+        for x in self._daemons:
+            x.unsubscribe()
+
+        # Let the transports close.
+        self._loop.run_until_complete(sleep(0))
+        self._loop.close()
+
+    def stop(self):
+        if self.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+            self.join(_REQUEST_TIMEOUT)
+
+# NOTES
 #
-#  [A3] Enhance the disabled state. Use gray for foreground color. See the
-#  "State Specific Style Options" section of the following tutorial.
+#   [X1] A recording is a set of files, "<path>.0001", "<path>.0002" and so
+#   on. Each starts with a magic line and the daemons as a JSON line, then
+#   has records: a fixed header (wall time, kind, daemon index, sizes of
+#   the topic and of the message) followed by the raw frames, as read from
+#   the sockets. Nothing is decoded, so recording a message costs a pack and
+#   a buffered write, flushed once "_RECORD_FLUSH" seconds have passed. The
+#   streams are written from the ingest thread (see [Q1]), control requests
+#   and replies from the main thread, under a lock. A file that
+#   reaches "_RECORD_SIZE" bytes is closed and the next one started, and
+#   only the last "_RECORD_FILES" are kept. The replies to "list" and
+#   "options" are always recorded, other control requests and replies on
+#   demand. The last discovery replies are written again at the start of
+#   every file, so that each file can be replayed on its own.
 #
-#    http://www.tkdocs.com/tutorial/styles.html
+#   [X2] Files are read through memory maps. Record headers are unpacked in
+#   place, and only the records replayed are copied. The time of the first
+#   record of each file is read up front, so seeking picks a file by
+#   bisection, then skips record headers within it. A partial record at the
+#   end of a file (the recorder may be writing it) ends the file.
 #
-class _Application(Tk):
-    '''Ringmaster main application window.'''
+class _Recorder:
+    '''Append-only, size-rotated recording of the streams. See [X1].'''
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
+    def __init__(self, path, daemons, limit=_RECORD_SIZE, keep=_RECORD_FILES):
+        self._path = path
+        self._header = _RECORD_MAGIC + dumps(daemons).encode() + b'\n'
+        self._limit = limit
+        self._keep = keep
+        self._numbers = [x for x, __ in _recordings(path)]
+        self._file = None
+        self._size = 0
+        self._flushed = monotonic()
+        self._lock = Lock()
+        self._retained = OrderedDict()
 
-        # Internal.
-        self._sub = self._req1 = self._rep1 = self._req2 = self._rep2 = None
-        self._running = True
-        self._toplevel = None
+        self._rotate()
 
-        # GUI.
-        self._font = font.Font(family='Helvetica', size=12)  # See [A1].
-        self._master = ttk.Frame(self, name='master', padding=(10, 10, 10, 10))
-        self._title = ttk.Label(self._master, text='Watchers', font='-size 16')
-        self._frame = ttk.Frame(self._master, name='frame')
-        self._button = ttk.Button(self._master, text='Quit')
-        self._grid = self._frame.children
+    def write(self, index, kind, topic, msg):
+        data = _RECORD.pack(time(), kind, index, len(topic), len(msg)) + \
+            topic + msg
 
-        self.createcommand('::tk::mac::Quit', self._quit)  # See [A2].
-        self.resizable(False, False)
-        self.minsize(320, 160)
-        self.title(_TITLE)
+        with self._lock:
+            self._file.write(data)
+            self._size += len(data)
 
-        self._master.grid(row=0, column=0, sticky='NSEW')
-        self._title.grid(row=0, column=0, pady=(0, 10))
-        self._frame.grid(row=1, column=0, sticky='EW')
-        self._button.grid(row=2, column=0, sticky='EW', pady=(10, 0))
+            if kind == _RECORD_REPLY and \
+                    topic.startswith((b'list ', b'options ')):
+                self._retained[index, topic] = msg
 
-        self.columnconfigure(0, weight=1)
-        self.rowconfigure(0, weight=1)
-        self._master.columnconfigure(0, weight=1)
-        self._frame.columnconfigure(0, weight=1)
+            if self._size >= self._limit:
+                self._rotate()
 
-        self._button.bind('<Button-1>', lambda x: self._quit())
+            elif monotonic() - self._flushed >= _RECORD_FLUSH:
+                self._flushed = monotonic()
 
-    @coroutine
-    def setup(self):
-        factory1 = lambda: _CircusSubProtocol(self)
-        factory2 = lambda: _CircusDealerProtocol(self, '_rep1')
-        factory3 = lambda: _CircusDealerProtocol(self, '_rep2')
+                self._file.flush()
 
-        self._sub, __ = yield from create_zmq_connection(factory1, SUB)
-        self._req1, _ = yield from create_zmq_connection(factory2, DEALER)
-        self._req2, _ = yield from create_zmq_connection(factory3, DEALER)
+    def close(self):
+        with self._lock:
+            self._file.close()
 
-        self._sub.subscribe(b'')
-        self._sub.connect(_CIRCUS_STATS_ADDR)
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
 
-        self._req1.setsockopt(LINGER, 0)
-        self._req1.setsockopt(IDENTITY, uuid4().hex.encode())
-        self._req1.connect(_CIRCUS_CONTROL_ADDR)
+        self._numbers.append(self._numbers[-1] + 1 if self._numbers else 1)
 
-        self._req2.setsockopt(LINGER, 0)
-        self._req2.setsockopt(IDENTITY, uuid4().hex.encode())
-        self._req2.connect(_CIRCUS_CONTROL_ADDR)
+        self._file = open('{}.{:04d}'.format(self._path, self._numbers[-1]),
+                          'wb', buffering=1 << 20)
+        self._size = self._file.write(self._header)
 
-    @coroutine
-    def paint(self):
-        set1 = set((yield from self._do_request('list')).get('watchers', []))
-        set2 = set()
-        set3 = set()
+        for (index, topic), msg in self._retained.items():
+            self._size += self._file.write(_RECORD.pack(
+                time(), _RECORD_REPLY, index, len(topic), len(msg)) + topic +
+                msg)
 
-        ttk.Style().map('TLabel', foreground=[('disabled', 'gray')])  # [A3].
-        ttk.Style().map('TButton', foreground=[('disabled', 'gray')])
+        while len(self._numbers) > self._keep:
+            remove('{}.{:04d}'.format(self._path, self._numbers.pop(0)))
 
-        # Pass one, classify watchers: all, singletons and forgotten.
-        for watcher in set1:
-            conf = yield from self._do_request('options', watcher)
+class _Recording:
+    '''A recording, read through memory maps. See [X2].'''
 
-            if conf['options']['singleton']:
-                set2.add(watcher)
+    def __init__(self, path):
+        self.paths = [path] if isfile(path) else \
+            [x for __, x in _recordings(path)]
+        self._starts = []
 
-            if 'forget' in conf['options']:
-                set3.update(conf['options']['forget'].split())
+        if not self.paths:
+            raise OSError('no recording at {}'.format(path))
 
-        # Pass two, assemble the watcher grid.
-        for i, name in enumerate(sorted(set1 - set3)):
-            lb1 = ttk.Label(self._frame, name=name + '+l', text=_DOT(name))
-            lb2 = ttk.Label(self._frame, name=name + '+c1', text='–')
+        for x in self.paths:
+            with open(x, 'rb') as f, _map(f) as m:
+                daemons, offset = self._header(m, x)
 
-            lb1.grid(row=i, column=0, sticky='EW')
-            lb2.grid(row=i, column=1)
+                if offset + _RECORD.size <= len(m):
+                    self._starts.append(_RECORD.unpack_from(m, offset)[0])
 
-            lb2.config(anchor='center', width=25, foreground='grey')
+                else:
+                    self._starts.append(inf)
 
-            if name in set2:
-                bt1 = ttk.Button(self._frame, name=name + '+c2', text='Start')
-                bt2 = ttk.Button(self._frame, name=name + '+r', text=' +')
+            if x == self.paths[0]:
+                self.daemons = [tuple(y) for y in daemons]
 
-                bt1.grid(row=i, column=2, columnspan=2, sticky='EW')
-                bt2.grid(row=i, column=4)
+        self.start = min(self._starts)
 
-                bt1.bind('<Button-1>', partial(self._start_watcher, name))
-                bt2.config(state='disabled', width=3)
+    def records(self, start=None):
+        '''Records from time "start" on, oldest first. Earlier replies of
+        the same file too, they hold the state of the watchers.'''
 
-            else:
-                bt1 = ttk.Button(self._frame, name=name + '+c2', text='Incr')
-                bt2 = ttk.Button(self._frame, name=name + '+c3', text='Decr')
-                bt3 = ttk.Button(self._frame, name=name + '+r', text=' +')
+        first = max(0, bisect_right(self._starts, start) - 1) if start else 0
 
-                bt1.grid(row=i, column=2)
-                bt2.grid(row=i, column=3)
-                bt3.grid(row=i, column=4)
+        for path in self.paths[first:]:
+            with open(path, 'rb') as f, _map(f) as m:
+                __, offset = self._header(m, path)
+                size = len(m)
 
-                bt1.bind('<Button-1>', partial(self._incr_process, name))
-                bt2.config(state='disabled')
-                bt3.config(state='disabled', width=3)
+                while offset + _RECORD.size <= size:
+                    when, kind, index, a, b = _RECORD.unpack_from(m, offset)
+                    offset += _RECORD.size
 
-            # Put metadata in label one.
-            lb1._w_procs = []
-            lb1._w_state = 'stopped'
-            lb1._w_singleton = name in set2
+                    if offset + a + b > size:
+                        break
 
-        # Pass three, continuously update watcher state.
-        while self._running:
-            for name in set1 - set3:
-                state = yield from self._do_request('status', name)
-                stats = yield from self._do_request('stats', name)
-                procs = list(stats.get('info', {}).keys())
-                label = self._grid[name + '+l']
+                    elif start is None or when >= start or \
+                            kind == _RECORD_REPLY:
+                        yield (when, kind, index, m[offset:offset + a],
+                               m[offset + a:offset + a + b])
 
-                label._w_state = state
+                    offset += a + b
 
-                if sorted(label._w_procs) != sorted(procs):  # See [LEAK2].
-                    label._w_procs = [int(x) for x in procs]
+    def _header(self, m, path):
+        end = m.find(b'\n', len(_RECORD_MAGIC))
 
-                    self._update_watcher_state_a(name)
+        if m[:len(_RECORD_MAGIC)] != _RECORD_MAGIC or end < 0:
+            raise ValueError('{} is not a recording'.format(path))
 
-            yield from sleep(0.5)
+        return loads(m[len(_RECORD_MAGIC):end].decode()), end + 1
 
-    # Taken from "http://www.reddit.com/r/Python/comments/33ecpl".
-    #
-    # For a threaded approach, see the ActiveState recipe mentioned by Guido
-    # van Rossum at the "Tkinter-discuss" list ("http://goo.gl/VJI1oJ").
-    #
-    @coroutine
-    def mainloop(self, interval=0.05):
-        '''Run a tkinter app in an asyncio event loop.'''
+def _map(f):
+    '''Map a whole file, read only.'''
 
-        try:
-            while self._running:
-                self.update()
+    from mmap import mmap, ACCESS_READ  # See [C2].
 
-                yield from sleep(interval)
+    return mmap(f.fileno(), 0, access=ACCESS_READ)
 
-        except TclError as e:
-            if 'application has been destroyed' not in e.args[0]:
-                raise
+def _snapshot(directory, control):
+    '''Path of the fleet snapshot of a daemon. See [C1].'''
 
-    # This method:
-    #
-    #   1. Is a standard coroutine. Cannot run concurrently, otherwise a
-    #      second request may happen before a reply arrives. It is called
-    #      only from "_paint, so concurrency is not an issue. But be
-    #      aware when calling this method from other methods or functions.
-    #
-    #   2. Writes to socket "_req1". This is a REQ/REP socket that will only
-    #      receive monitoring commands.
-    #
-    #   3. Does not return error messages. Monitoring commands are passive,
-    #      automatically issued by the program. A fail can simply be discarded,
-    #      and the GUI updates that would arise from it, bypassed. A common
-    #      error is caused by the process stopping while Circus is executing a
-    #      command on it, like "stats".
-    #
-    @coroutine
-    def _do_request(self, action, name=''):
-        query = {'id': uuid4().hex, 'command': action}
-        reply = {}
+    return join(directory, ''.join(x if x.isalnum() or x in '.-' else '_'
+                                   for x in control) + '.json')
 
-        if name:
-            query['properties'] = {'name': name}
+def _recordings(path):
+    '''Numbers and names of the files of a recording, oldest first.'''
 
-        self._rep1 = Future()
+    from glob import glob, escape  # See [C2].
 
-        self._req1.write([dumps(query).encode()])
+    found = []
 
-        reply = yield from self._rep1
+    for x in glob(escape(path) + '.*'):
+        suffix = x[len(path) + 1:]
 
-        if query['id'] == reply['id'] and action == 'status':
-            return reply['status']
+        if suffix.isdigit():
+            found.append((int(suffix), x))
 
-        elif query['id'] == reply['id'] and reply['status'] == 'ok':
-            return reply
+    return sorted(found)
+
+# NOTES
+#
+#   [R1] Rows are marked dirty whenever their state changes, as often as that
+#   may be. A render pass runs at most once every frame, and renders each
+#   dirty row once. Along with "_config" and "_bind", this bounds Tk work by
+#   the frame rate instead of the stats message rate. See [LEAK], in
+#   "ringmaster_tk".
+#
+class _RenderScheduler:
+    '''Coalesce watcher row updates into one render pass per frame.'''
 
-        elif query['id'] == reply['id']:
-            return {}
+    def __init__(self, render, rate=_FRAME_RATE):
+        self._render = render
+        self._interval = 1 / rate
+        self._dirty = set()
+        self._handle = None
+        self._last = 0
+        self._times = deque(maxlen=rate)
 
-        else:
-            raise Exception()
+        # Counters.
+        self.marks = self.rows = self.frames = 0
+        self.durations = _Histogram()
 
-    # This method:
-    #
-    #   1. Is a coroutine, mostly because it needs to block to prevent that
-    #      more than one request is written on the REQ/REP socket before a
-    #      reply arrives. It can run concurrently, and often will, since it
-    #      will be spawned from event handlers attached to buttons and other
-    #      GUI widgets. That is also why it adopts a callback approach to
-    #      provide a reply. Tkinter event handlers cannot yield on the result
-    #      of a coroutine.
-    #
-    #   2. Writes to socker "_req2". This socket should be used to send
-    #      management commands to wachers, like stop, increment a process etc.
-    #
-    #   3. Returns error messages. Here, actions sent to Circus come from
-    #      direct interaction with the GUI, and errors messages are expected.
-    #
-    @coroutine
-    def _on_reply(self, action, name, on_reply_ok, on_reply_error):
-        def callback(future):
-            reply = future.result()
+    def mark(self, name):
+        self.marks += 1
 
-            if query['id'] == reply['id'] and reply['status'] == 'ok':
-                on_reply_ok(reply)
+        self._dirty.add(name)
 
-            elif query['id'] == reply['id']:
-                on_reply_error(reply['reason'].capitalize() + '.')
+        if self._handle is None:
+            delay = max(0, self._last + self._interval - monotonic())
 
-            else:
-                raise Exception()
+            self._handle = get_event_loop().call_later(delay, self._flush)
 
-        query = {'id': uuid4().hex, 'command': action}
+    def _flush(self):
+        dirty, self._dirty = self._dirty, set()
 
-        query['properties'] = {'name': name}
+        self._handle = None
+        self._last = monotonic()
+        self.frames += 1
+        self.rows += len(dirty)
 
-        if action == 'incr' or action == 'decr':
-            query['properties'].update({'waiting': False, 'nb': 1})
+        self._times.append(self._last)
 
-        elif action == 'start' or action == 'stop':
-            query['properties'].update({'waiting': False, 'match': 'glob'})
+        self._render(dirty)
+
+        self.durations.observe(monotonic() - self._last)
 
-        # Block to prevent writing multiple requests before reading a reply.
-        if self._rep2:
-            yield from self._rep2
+    def frame_rate(self):
+        '''Render passes in the last second.'''
 
-        self._rep2 = Future()
+        return sum(1 for x in self._times if monotonic() - x <= 1)
 
-        self._rep2.add_done_callback(callback)
+    def coalescing_ratio(self):
+        '''Row updates requested per row actually rendered.'''
 
-        self._req2.write([dumps(query).encode()])
+        return self.marks / self.rows if self.rows else 1.0
 
-    def _update_watcher_state_a(self, name):  # See [LEAK].
-        lb1 = self._grid[name + '+l']
-        lb2 = self._grid[name + '+c1']
+    def counters(self):
+        return {'marks': self.marks, 'rows': self.rows, 'frames': self.frames,
+                'frame_rate': self.frame_rate(),
+                'coalescing_ratio': self.coalescing_ratio()}
 
-        if lb1._w_singleton:
-            bt1 = self._grid[name + '+c2']
-            bt2 = self._grid[name + '+r']
+# NOTES
+#
+#   [H1] A tier is a ring buffer of fixed size, with an array per series.
+#   Samples are averaged over periods of the resolution of the tier. When a
+#   sample falls in a new period, the average of the previous one is stored,
+#   and handed down as a sample to the next tier. Periods without samples
+#   are stored as NaN. Memory use does not depend on how long the program
+#   runs.
+#
+#   [H2] With thousands of watchers, the tiers are most of the memory of the
+#   program, so the arrays hold single-precision floats (plenty for a chart)
+#   and grow with the samples stored, up to the size of the tier. The coarse
+#   tier of a watcher seen for an hour holds 60 samples, not 1440. Missing
+#   samples read as NaN.
+#
+class _Tier:
+    '''Fixed-size, array-backed ring buffer of samples. See [H1].'''
 
-            if lb1._w_procs:
-                lb2.config(foreground='darkgreen')
-                bt1.config(text='Stop')
-                bt2.config(state='normal')
+    __slots__ = ('resolution', 'size', 'series', 'head', 'period', 'sums',
+                 'count')
 
-                bt1.bind('<Button-1>', partial(self._stop_watcher, name))
-                bt2.bind('<Button-1>', partial(self._more_watcher, name))
+    def __init__(self, resolution, size, width):
+        self.resolution = resolution
+        self.size = size
+        self.series = [array('f') for i in range(width)]  # See [H2].
+        self.head = 0
+        self.period = None
+        self.sums = [0.0] * width
+        self.count = 0
 
-            else:
-                lb2.config(foreground='grey', text='–')
-                bt1.config(text='Start')
-                bt2.config(state='disabled')
+    def add(self, now, sample):
+        '''Add a sample. Return the time and average of a completed period.'''
 
-                bt1.bind('<Button-1>', partial(self._start_watcher, name))
-                bt2.unbind('<Button-1>')
+        period = int(now // self.resolution)
+        done = None
 
-        else:
-            bt1 = self._grid[name + '+c2']
-            bt2 = self._grid[name + '+c3']
-            bt3 = self._grid[name + '+r']
+        if period != self.period and self.count:
+            done = (self.period * self.resolution,
+                    [x / self.count for x in self.sums])
 
-            if lb1._w_procs:
-                lb2.config(foreground='darkgreen')
-                bt2.config(state='normal')
-                bt3.config(state='normal')
+            self._push(done[1])
 
-                bt1.bind('<Button-1>', partial(self._incr_process, name))
-                bt2.bind('<Button-1>', partial(self._decr_process, name))
-                bt3.bind('<Button-1>', partial(self._more_watcher, name))
+            for i in range(min(period - self.period - 1, self.size)):
+                self._push([nan] * len(self.sums))
 
-            else:
-                lb2.config(foreground='grey', text='–')
-                bt2.config(state='disabled')
-                bt3.config(state='disabled')
+            self.sums = [0.0] * len(self.sums)
+            self.count = 0
 
-                bt1.bind('<Button-1>', partial(self._incr_process, name))
-                bt2.unbind('<Button-1>')
-                bt3.unbind('<Button-1>')
+        self.period = period
+        self.count += 1
 
-    def _update_watcher_state_b(self, watcher, stats):  # See [LEAK].
-        if watcher + '+l' in self._grid and 'pid' in stats:
-            lb1 = self._grid[watcher + '+l']
+        for i, x in enumerate(sample):
+            self.sums[i] += x
 
-            lb1._w_procs = [int(x) for x in stats['pid']]
+        return done
 
-            if stats['pid']:
-                lb2 = self._frame.children[watcher + '+c1']
-                tpl = '{}: {cpu:.1%} cpu, {mem:.1%} mem'
+    def values(self, i, count=None):
+        '''The last values of series "i", oldest first.'''
 
-                if stats['cpu'] == 'N/A':
-                    stats['cpu'] = 0
+        series = self.series[i]
+        size = len(series)
+        count = self.size if count is None else min(count, self.size)
+        missing = max(0, count - size)
 
-                else:
-                    stats['cpu'] /= 100.0
+        return [nan] * missing + [series[(self.head - count + j) % size]
+                                  for j in range(missing, count)]
 
-                if stats['mem'] == 'N/A':
-                    stats['mem'] = 0
+    def _push(self, sample):
+        if len(self.series[0]) < self.size:
+            for series, x in zip(self.series, sample):
+                series.append(x)
 
-                else:
-                    stats['mem'] /= 100.0
+        else:
+            for series, x in zip(self.series, sample):
+                series[self.head] = x
 
-                # http://docs.python.org/3/library/string.html#format-examples.
-                lb2.config(text=tpl.format(len(stats['pid']), **stats))
+        self.head = (self.head + 1) % self.size
 
-            if self._toplevel:
-                self._toplevel._painter.send(None)
+class _History:
+    '''History of cpu, memory and process count, at the "_HISTORY" tiers.'''
 
-    def _start_watcher(self, name, event):
-        def ok(reply):
-            lbl._w_procs.append(0)  # Request actual PIDs here (FIXME).
+    __slots__ = ('tiers',)
 
-            self._update_watcher_state_a(name)
+    def __init__(self):
+        self.tiers = [_Tier(x, y, 3) for x, y in _HISTORY]
 
-        def error(message):
-            btn.bind('<Button-1>', partial(self._start_watcher, name))
+    def add(self, now, cpu, mem, procs):
+        sample = (cpu, mem, procs)
 
-            messagebox.showerror('Error', message + '.')
+        for tier in self.tiers:
+            done = tier.add(now, sample)
 
-        lbl = self._grid[name + '+l']
-        btn = self._grid[name + '+c2']
+            if done is None:
+                break
 
-        btn.unbind('<Button-1>')
+            now, sample = done
 
-        async(self._on_reply('start', name, ok, error))
+# NOTES
+#
+#   [S1] The store is the single source of truth for the state of watchers.
+#   It is written from Circus replies and streams only, never from guesses
+#   about the outcome of a command, and notifies its subscribers of the
+#   watchers whose state actually changed.
+#
+class _WatcherState:
+    '''State of a watcher.'''
 
-    def _stop_watcher(self, name, event):
-        def ok(reply):
-            lbl._w_procs.pop()  # Request actual PIDs here (FIXME).
+    __slots__ = ('name', 'daemon', 'watcher', 'state', 'singleton', 'pids',
+                 'cpu', 'mem', 'numprocesses', 'updated')
 
-            self._update_watcher_state_a(name)
+    def __init__(self, name, daemon, watcher):
+        self.name = name
+        self.daemon = daemon
+        self.watcher = watcher
+        self.state = 'stopped'
+        self.singleton = None  # Unknown until the watcher is classified.
+        self.pids = frozenset()
+        self.cpu = None
+        self.mem = None
+        self.numprocesses = None
+        self.updated = 0
 
-        def error(message):
-            btn.bind('<Button-1>', partial(self._start_watcher, name))
+    @property
+    def procs(self):
+        return len(self.pids)
 
-            messagebox.showerror('Error', message + '.')
+class _WatcherStore:
+    '''Watcher states, by watcher name. See [S1].'''
 
-        lbl = self._frame.children[name + '+l']
-        btn = self._frame.children[name + '+c2']
+    def __init__(self):
+        self._states = {}
+        self._subscribers = []
 
-        btn.unbind('<Button-1>')
+    def __contains__(self, name):
+        return name in self._states
 
-        async(self._on_reply('stop', name, ok, error))
+    def __getitem__(self, name):
+        return self._states[name]
 
-    def _more_watcher(self, name, event):
-        self._toplevel = _Dialog(self, name)
+    def __iter__(self):
+        return iter(self._states)
 
-    def _incr_process(self, watcher, event):
-        def ok1(reply):
-            lbl._w_procs.append(0)  # Request actual PIDs here (FIXME).
-            lbl._w_state = 'active'
+    def __len__(self):
+        return len(self._states)
 
-            self._update_watcher_state_a(watcher)
+    def subscribe(self, callback):
+        '''Call "callback" with the name of every watcher that changes.'''
 
-        def ok2(reply):
-            lbl._w_procs.append(0)  # Request actual PIDs here (FIXME).
+        self._subscribers.append(callback)
 
-            self._update_watcher_state_a(watcher)
+    def add(self, name, daemon, watcher):
+        self._states[name] = _WatcherState(name, daemon, watcher)
 
-        def error(message):
-            btn.bind('<Button-1>', partial(self._incr_process, watcher))
+    def remove(self, name):
+        del self._states[name]
+
+    def update(self, name, **changes):
+        '''Change the state of a watcher, and notify actual changes.'''
+
+        state = self._states.get(name)
+        dirty = False
+
+        if state is None:
+            return
+
+        # A watcher without processes uses nothing. A stopped watcher gets
+        # no more stats, so its last sample would stay, and feed alerts,
+        # rollups and metrics.
+        if not changes.get('pids', True):
+            changes.update(cpu=0.0, mem=0.0)
+
+        for key, value in changes.items():
+            if getattr(state, key) != value:
+                setattr(state, key, value)
+
+                dirty = True
 
-            messagebox.showerror('Error', message + '.')
+        state.updated = monotonic()
 
-        lbl = self._grid[watcher + '+l']
-        btn = self._grid[watcher + '+c2']
+        if dirty:
+            for callback in self._subscribers:
+                callback(name)
 
-        btn.unbind('<Button-1>')
+# NOTES
+#
+#   [L1] Alert rules are evaluated where samples arrive: on every stats
+#   message of a watcher (see [I1]), on polls, and on watcher events. There
+#   is no timer. The rules of a watcher are matched against its dotted name
+#   once, so a sample costs a check per rule of its watcher, whatever the
+#   number of rules and watchers. A rule fires once its value has stayed
+#   above the threshold for the number of seconds of the rule, and clears
+#   once the value falls to the clear threshold, which is lower. Values in
+#   between change nothing, so an alert does not flap around its threshold.
+#
+#   [L2] Metrics are "cpu" and "mem" (usage ratios of the watcher),
+#   "missing" (processes short of "numprocesses", for active watchers) and
+#   "spawns" (processes spawned in the last "_FLAPPING_WINDOW" seconds, a
+#   watcher whose processes keep dying is flapping). The "numprocesses"
+#   option is read at discovery, and follows the replies to commands.
+#
+#   [L4] Only respawns count as spawns: a spawn that replaces a process
+#   reaped or killed. Processes spawned by an incr, a start or a restart
+#   replace nothing, and a command sent from here, or a watcher started or
+#   stopped, forgets the processes that died until then. Restarting a
+#   large watcher is not flapping.
+#
+class _Rule:
+    '''An alert rule. See [L1].'''
+
+    __slots__ = ('name', 'metric', 'threshold', 'clear', 'seconds',
+                 'pattern')
 
-        if lbl._w_state == 'stopped':
-            async(self._on_reply('start', watcher, ok1, error))
+    def __init__(self, name, metric, threshold, clear, seconds, pattern='*'):
+        self.name = name
+        self.metric = metric
+        self.threshold = threshold
+        self.clear = clear
+        self.seconds = seconds
+        self.pattern = pattern
+
+    def format(self, value):
+        if self.metric in ('cpu', 'mem'):
+            return '{} {:.1%}'.format(self.metric, value)
 
         else:
-            async(self._on_reply('incr', watcher, ok2, error))
+            return '{} {:g}'.format(self.metric, value)
 
-    def _decr_process(self, watcher, event):
-        def ok(reply):
-            lbl._w_procs.pop()  # Request actual PIDs here (FIXME).
+class _Alerts:
+    '''Alert rules, evaluated on the stats stream. See [L1].'''
 
-            self._update_watcher_state_a(watcher)
+    def __init__(self, store, rules, listener):
+        self.rules = rules
+        self.firing = OrderedDict()  # (watcher, rule) -> (time, value).
+        self.recorded = False  # Whether times are those of a recording.
+        self._store = store
+        self._listener = listener
+        self._rules = {}
+        self._since = {}
+        self._spawns = {}
+        self._deaths = {}
 
-        def error(message):
-            btn.bind('<Button-1>', partial(self._decr_process, watcher))
+    def match(self, name):
+        '''The rules that apply to a watcher.'''
 
-            messagebox.showerror('Error', message + '.')
+        rules = self._rules.get(name)
 
-        lbl = self._grid[watcher + '+l']
-        btn = self._grid[watcher + '+c3']
+        if rules is None:
+            watcher = _DOT(self._store[name].watcher)
+            rules = self._rules[name] = [x for x in self.rules
+                                         if fnmatchcase(watcher, x.pattern)]
 
-        btn.unbind('<Button-1>')
+        return rules
 
-        async(self._on_reply('decr', watcher, ok, error))
+    def alerting(self, name):
+        return any((name, x) in self.firing for x in self.match(name))
 
-    def _quit(self):
-        self._running = False
+    def evaluate(self, name, now=None):
+        '''Evaluate the rules of a watcher, at the time of its sample.'''
 
-def main():
-    loop = get_event_loop()
-    root = _Application()
+        if name not in self._store:
+            return
 
-    loop.run_until_complete(root.setup())
-    loop.create_task(root.paint())
-    loop.run_until_complete(root.mainloop())
+        now = monotonic() if now is None else now
+        state = self._store[name]
+
+        for rule in self.match(name):
+            key = name, rule
+            value = self._value(rule.metric, name, state, now)
+
+            if value is None:
+                continue
+
+            elif key in self.firing:
+                if value <= rule.clear:
+                    del self.firing[key]
+
+                    self._listener(name, rule, value, False)
+
+            elif value > rule.threshold:
+                since = self._since.setdefault(key, now)
+
+                if now - since >= rule.seconds:
+                    del self._since[key]
+
+                    self.firing[key] = (now if self.recorded else time(),
+                                        value)
+
+                    self._listener(name, rule, value, True)
+
+            else:
+                self._since.pop(key, None)
+
+    def spawned(self, name, now):  # See [L4].
+        deaths = self._deaths.get(name, 0)
+
+        if deaths:
+            self._deaths[name] = deaths - 1
+
+            self._spawns.setdefault(name, deque()).append(now)
+
+    def died(self, name):
+        if any(x.metric == 'spawns' for x in self.match(name)):
+            self._deaths[name] = self._deaths.get(name, 0) + 1
+
+    def expect(self, name):
+        '''Processes of the watcher change on purpose. See [L4].'''
+
+        self._deaths.pop(name, None)
+
+    def forget(self, name):
+        for rule in self._rules.pop(name, ()):
+            self.firing.pop((name, rule), None)
+            self._since.pop((name, rule), None)
+
+        self._spawns.pop(name, None)
+        self._deaths.pop(name, None)
+
+    def _value(self, metric, name, state, now):  # See [L2].
+        if metric == 'cpu':
+            return state.cpu
+
+        elif metric == 'mem':
+            return state.mem
+
+        elif metric == 'missing':
+            if state.state != 'active':
+                return 0
+
+            elif state.numprocesses is not None:
+                return state.numprocesses - len(state.pids)
+
+        elif metric == 'spawns':
+            spawns = self._spawns.get(name, ())
+
+            while spawns and now - spawns[0] > _FLAPPING_WINDOW:
+                spawns.popleft()
+
+            return len(spawns)
+
+# NOTES
+#
+#   [W1] Watcher names are split on "-" into namespaces. Every namespace is a
+#   group node, keyed by the Circus glob of its watchers under the daemon
+#   key (like "host:5555/web-*"). Groups keep the totals of their watchers.
+#   The last sample of each watcher is kept. When it changes, only the
+#   difference is added to the groups up the ancestor chain, so an update
+#   costs the depth of the watcher, whatever the size of the fleet.
+#
+#   [W2] Groups start collapsed. Clicking the name of a group expands it, or
+#   collapses it again. The tree is flattened, depth first, into the rows of
+#   the watcher list (see [V1], in "ringmaster_tk"), with the children of
+#   each node in the list order. Groups are sorted by their totals.
+#
+class _Group:
+    '''A namespace of watchers, with their totals. See [W1].'''
+
+    __slots__ = ('name', 'watcher', 'parent', 'depth', 'children', 'count',
+                 'procs', 'cpu', 'mem', 'collapsed')
+
+    def __init__(self, name, watcher, parent, depth):
+        self.name = name
+        self.watcher = watcher
+        self.parent = parent
+        self.depth = depth
+        self.children = set()
+        self.count = self.procs = 0
+        self.cpu = self.mem = 0.0
+        self.collapsed = True
+
+class _Namespaces:
+    '''Watchers grouped by namespace, with incremental totals. See [W1].'''
+
+    def __init__(self, store, listener):
+        self.groups = {}
+        self._store = store
+        self._listener = listener
+        self._roots = {}
+        self._parents = {}
+        self._samples = {}
+
+    def add(self, name):
+        state = self._store[name]
+        parts = state.watcher.split('-')
+        parent = None
+
+        for i in range(1, len(parts)):
+            prefix = '-'.join(parts[:i])
+            key = '{}/{}-*'.format(state.daemon, prefix)
+
+            if key not in self.groups:
+                self.groups[key] = _Group(key, prefix, parent, i - 1)
+
+                self._children(state.daemon, parent).add(key)
+
+            parent = key
+
+        self._parents[name] = state.daemon, parent
+        self._samples[name] = (0, 0.0, 0.0)
+
+        self._children(state.daemon, parent).add(name)
+        self._apply(parent, 1, 0, 0.0, 0.0)
+
+        self.update(name)
+
+    def remove(self, name):
+        if name not in self._samples:
+            return
+
+        procs, cpu, mem = self._samples.pop(name)
+        daemon, parent = self._parents.pop(name)
+
+        self._apply(parent, -1, -procs, -cpu, -mem)
+        self._children(daemon, parent).discard(name)
+
+        # Drop the groups left empty.
+        while parent and not self.groups[parent].children:
+            group = self.groups.pop(parent)
+            parent = group.parent
+
+            self._children(daemon, parent).discard(group.name)
+
+    def update(self, name):
+        '''Apply the last sample of a watcher to its groups.'''
+
+        if name in self._samples and name in self._store:
+            state = self._store[name]
+            sample = (len(state.pids), state.cpu or 0.0, state.mem or 0.0)
+            last = self._samples[name]
+
+            if sample != last:
+                self._samples[name] = sample
+
+                self._apply(self._parents[name][1], 0,
+                            *[a - b for a, b in zip(sample, last)])
+
+    def flatten(self, daemon, key):  # See [W2].
+        '''Return the visible nodes of a daemon, depth first.'''
+
+        order = []
+        stack = [self._sorted(self._roots.get(daemon, ()), key)]
+
+        while stack:
+            if not stack[-1]:
+                stack.pop()
+
+                continue
+
+            name = stack[-1].pop()
+
+            order.append(name)
+
+            if name in self.groups and not self.groups[name].collapsed:
+                stack.append(self._sorted(self.groups[name].children, key))
+
+        return order
+
+    def label(self, name):
+        '''Name of a node relative to its parent, indented by depth.'''
+
+        if name in self.groups:
+            node = self.groups[name]
+            parent, depth = node.parent, node.depth
+
+        else:
+            node = self._store[name]
+            parent = self._parents[name][1]
+            depth = self.groups[parent].depth + 1 if parent else 0
+
+        text = node.watcher
+
+        if parent:
+            text = text[len(self.groups[parent].watcher) + 1:]
+
+        return '  ' * depth + _DOT(text)
+
+    def _sorted(self, names, key):
+        # Reversed, to be popped from the end.
+        return sorted(names, reverse=True, key=lambda x: key(
+            self.groups[x] if x in self.groups else self._store[x]))
+
+    def _children(self, daemon, parent):
+        if parent is None:
+            return self._roots.setdefault(daemon, set())
+
+        return self.groups[parent].children
+
+    def _apply(self, name, count, procs, cpu, mem):  # See [W1].
+        while name is not None:
+            group = self.groups[name]
+            group.count += count
+            group.procs += procs
+            group.cpu += cpu
+            group.mem += mem
+
+            self._listener(name)
+
+            name = group.parent
+
+# NOTES
+#
+#   [G1] Commands on many watchers are sent concurrently, and pipelined on the
+#   "mux2" multiplexer of each daemon (see [M1]). Start, stop and restart
+#   accept a glob in Circus. When the watchers were selected with a pattern,
+#   and the pattern matches exactly the selected watchers of a daemon (the
+#   forgotten ones included), a single command is sent to that daemon. The
+#   replies are counted by a "_Batch", whose summary stands for the message
+#   boxes of single commands.
+#
+class _Batch:
+    '''Progress of a command sent to many watchers. See [G1].'''
+
+    def __init__(self, action, total, listener):
+        self.action = action
+        self.total = total
+        self.done = 0
+        self.failed = []
+        self._listener = listener
+
+    def finished(self, names, reason=None):
+        self.done += len(names)
+
+        if reason:
+            self.failed.extend((x, reason) for x in names)
+
+        self._listener(self)
+
+    def summary(self):
+        text = '{}: {} of {} done'.format(self.action.capitalize(),
+                                          self.done, self.total)
+
+        if self.failed:
+            text += ', {} failed ({})'.format(len(self.failed),
+                                              self.failed[0][1].lower())
+
+        return text
+
+class _Monitor:
+    '''Discovery, polling and stream ingest of Circus daemons. See [N1].'''
+
+    def __init__(self, daemons, alerts=_ALERTS, hook=None, cache=_CACHE_DIR,
+                 pid_history=_PID_HISTORY):
+        self._daemons = OrderedDict()
+        self._cache = cache
+        self._running = True
+        self._store = _WatcherStore()
+        self._alerts = _Alerts(self._store, [_Rule(*x) for x in alerts],
+                               self._alert_changed)
+        self._hook = hook
+        self._hooks = Semaphore(_HOOK_FAN_OUT)
+        self._record_control = False
+        self._ingest = None
+        self._deltas = _Histogram()
+        self._history = {}
+        self._pid_history = {}
+        self._processes = {}
+        self._keep_history = True
+        self._keep_pid_history = pid_history
+        self._per_pid = pid_history
+        self._started = monotonic()
+        self._lag = _Histogram()
+        self._tasks = set()
+        self._evented = {}
+        self._delta_handle = None
+        self._delta_time = 0
+
+        for name, control, stats, pubsub in daemons:
+            listener = partial(self._reachable, name)
+
+            self._daemons[name] = _Daemon(name, control, stats, pubsub,
+                                          listener, self._spawn)
+
+    async def setup(self):
+        for x in self._daemons.values():
+            x.protocols(self)
+
+        self._ingest = _Ingest(list(self._daemons.values()))
+
+        self._ingest.start()
+        self._listen_deltas()
+
+        await gather(*[x.connect() for x in self._daemons.values()])
+
+    def close(self):
+        '''Stop the ingest thread, close every socket, save snapshots.'''
+
+        if self._ingest is not None:
+            self._ingest.stop()
+
+        for x in self._daemons.values():
+            x.close()
+
+            self._save(x)
+
+    # NOTES
+    #
+    #   [Y1] Every task of the monitor is started by "_spawn", and tracked
+    #   until it is done: the polling loops of "paint" (or "replay"),
+    #   discovery, commands, alert hooks and the reconnections of the
+    #   multiplexers (see [M3]). "_quit" cancels them, so each stops at the
+    #   request, sleep or reply it is waiting for, and releases its
+    #   multiplexer slot on the way out (see [M1]). "shutdown" waits until
+    #   they are all gone, before the sockets are closed.
+    #
+    #   [E2] The event loop lags when a wait outlasts its timeout. Only waits
+    #   that end by timing out are measured, into "_lag".
+    #
+    def _spawn(self, coro):  # See [Y1].
+        '''Run a coroutine in a task of the monitor.'''
+
+        task = ensure_future(coro)
+
+        self._tasks.add(task)
+
+        task.add_done_callback(self._tasks.discard)
+
+        return task
+
+    def _quit(self):  # See [Y1].
+        self._running = False
+
+        for x in list(self._tasks):
+            x.cancel()
+
+    async def shutdown(self):
+        '''Cancel every task, and wait for them to finish. See [Y1].'''
+
+        self._running = False
+
+        while self._tasks:
+            tasks = list(self._tasks)
+
+            for x in tasks:
+                x.cancel()
+
+            await gather(*tasks, return_exceptions=True)
+
+    def record(self, recorder, control=False):
+        '''Record the streams of every daemon. See [X1].'''
+
+        self._record_control = control
+
+        for i, x in enumerate(self._daemons.values()):
+            x.record = partial(recorder.write, i)
+
+    # NOTES
+    #
+    #   [X3] Replay stands for "setup" and "paint". Stats and events are fed
+    #   to stream protocols without sockets, which decode, coalesce and apply
+    #   them like those of a live Circus (see [I1]). Recorded replies to
+    #   discovery and status requests are applied too, those before the seek
+    #   point included, and watchers first seen in the streams get a row. At
+    #   speed 0, records are fed as fast as possible, with an iteration of
+    #   the event loop every "_REPLAY_BATCH" records.
+    #
+    #   [X4] Stats and events are stamped with the time they were recorded
+    #   at, not the time they are fed, and histories and alerts follow
+    #   those. Hours of recording replayed in seconds still fill hours of
+    #   history, and an alert fires after the seconds of its rule, in the
+    #   recording. Live messages are stamped with "monotonic" on receipt.
+    #
+    async def replay(self, recording, speed=1.0, seek=0.0):  # See [X3].
+        daemons = list(self._daemons.values())
+        start = recording.start + seek
+        origin = None
+        count = 0
+        added = []
+
+        for x in daemons:
+            x.ingest = _CircusSubProtocol(self, x)
+            x.feed = _CircusEventProtocol(self, x)
+            x.events = True
+
+        self._alerts.recorded = True
+
+        self._listen_deltas()
+
+        for when, kind, index, topic, msg in recording.records(start):
+            if not self._running:
+                break
+
+            daemon = daemons[index]
+
+            if when < start:
+                pass
+
+            elif not speed:
+                count += 1
+
+                if count % _REPLAY_BATCH == 0:
+                    self._replay_rows(added)
+
+                    await sleep(0)
+
+            elif origin is None:
+                origin = when, monotonic()
+
+            else:
+                delay = (when - origin[0]) / speed - (monotonic() - origin[1])
+
+                if delay > 0:
+                    self._replay_rows(added)
+
+                    await sleep(delay)
+
+            if kind == _RECORD_STATS:
+                if not _sockets_topic(topic):
+                    self._replay_watcher(daemon, topic[5:].split(b'.')[0],
+                                         added, 'active')
+
+                daemon.ingest.msg_received([topic, msg], when)
+
+            elif kind == _RECORD_EVENT:
+                name = topic.split(b'.', 1)[1].rsplit(b'.', 1)[0]
+
+                self._replay_watcher(daemon, name, added)
+
+                daemon.feed.msg_received([topic, msg], when)
+
+            elif kind == _RECORD_REPLY:
+                self._replay_reply(daemon, topic, msg)
+
+        self._replay_rows(added)
+
+    # Rows of the watchers first seen in a recording are added once per
+    # frame of the replay, like those of a "list" reply. A resort per row
+    # would cost quadratic time.
+    def _replay_watcher(self, daemon, watcher, added, state=None):
+        name = daemon.key(watcher.decode())
+
+        if watcher and name not in self._store:
+            self._add_row(daemon, watcher.decode())
+
+            if name in self._store:
+                added.append(name)
+
+        # Only the processes of active watchers have stats.
+        if state:
+            self._store.update(name, state=state)
+
+    def _replay_rows(self, added):
+        if added:
+            self._rows_added(added[:])
+
+            del added[:]
+
+    def _replay_reply(self, daemon, topic, msg):  # See [X3].
+        command, __, watcher = topic.decode().partition(' ')
+        reply = loads(msg.decode())
+
+        if command == 'list' and 'watchers' in reply:
+            names = [x for x in reply['watchers']
+                     if daemon.key(x) not in self._store]
+
+            for x in names:
+                self._add_row(daemon, x)
+
+            self._rows_added([daemon.key(x) for x in names
+                              if daemon.key(x) in self._store])
+
+        elif command == 'options' and 'options' in reply:
+            self._apply_options(daemon, watcher, reply['options'])
+
+        elif command == 'status' and watcher and reply['status'] != 'error':
+            self._store.update(daemon.key(watcher), state=reply['status'])
+
+        elif command == 'status' and 'statuses' in reply:
+            for x, state in reply['statuses'].items():
+                self._store.update(daemon.key(x), state=state)
+
+    # NOTES
+    #
+    #   [D1] A row is drawn for every watcher as soon as the list of watchers
+    #   arrives. Rows start as placeholders, and get their buttons once the
+    #   "options" reply classifies the watcher as a singleton or not. The
+    #   queries are sent concurrently, at most "_DISCOVERY_FAN_OUT" at a
+    #   time, which leaves room on "mux1" for the polling requests. Watchers
+    #   left unclassified by a failed query are queried again on the next
+    #   poll ticks, while the daemon is reachable.
+    #
+    #   [D2] A watcher can name other watchers to be "forgotten". Their rows
+    #   may have been drawn already, and are then removed.
+    #
+    #   [D3] Every daemon is discovered and polled by a task of its own. A slow
+    #   or dead daemon only delays its own watchers. See [N1].
+    #
+    #   [C1] The fleet of each daemon (watchers, options, state, last stats,
+    #   and the forgotten watchers) is saved to a snapshot file named after
+    #   the control endpoint: once discovery completes, every
+    #   "_CACHE_INTERVAL" seconds, and on exit. At startup, rows are drawn
+    #   from the snapshots before any request is sent. Discovery then runs
+    #   as usual, and patches the differences: rows of watchers that are gone
+    #   are removed, new ones added, and since the store only notifies actual
+    #   changes (see [S1]), rows that did not change are not redrawn.
+    #   Watchers forgotten in the snapshot stay hidden until every "options"
+    #   reply is in, and are shown if no longer forgotten.
+    #
+    async def paint(self):
+        for x in self._daemons.values():
+            self._restore(x)
+
+        await gather(*[self._paint(x) for x in self._daemons.values()])
+
+    async def _paint(self, daemon):  # See [D3].
+        names = None
+
+        while names is None and self._running:
+            reply = await self._do_request(daemon, 'list')
+            names = reply.get('watchers')
+
+            if names is None:
+                await sleep(_POLL_INTERVAL)
+
+        if names is None:
+            return
+
+        # Pass one, draw a placeholder row for every new watcher, and remove
+        # those that are gone. See [D1] and [C1].
+        cached, daemon.forgotten = daemon.forgotten, set()
+        live = {daemon.key(x) for x in names}
+        added = []
+
+        for name in daemon.watchers - live:
+            self._remove_row(daemon, name)
+
+        for name in names:
+            if name not in cached and daemon.key(name) not in self._store:
+                self._add_row(daemon, name)
+
+                added.append(daemon.key(name))
+
+        self._rows_added(added)
+
+        daemon.synced = True
+
+        # Pass two, classify watchers as the replies arrive.
+        classifying = self._spawn(self._classify_all(daemon, names, cached))
+
+        # Pass three, continuously update watcher state. While the pub/sub
+        # stream is connected, events keep the state current, and polling
+        # only reconciles what may have been missed.
+        last, saved = 0, monotonic()
+
+        while self._running:
+            if monotonic() - saved > _CACHE_INTERVAL:
+                saved = monotonic()
+
+                self._save(daemon)
+
+            if not daemon.events or monotonic() - last > _RECONCILE_INTERVAL:
+                last = monotonic()
+
+                if _BULK_POLLING:
+                    await self._poll_all(daemon)
+
+                else:
+                    await gather(*[self._poll(x)
+                                   for x in set(daemon.watchers)])
+
+            # Watchers whose "options" query failed. See [D1].
+            if classifying.done() and daemon.reachable:
+                retry = [self._store[x].watcher for x in daemon.watchers
+                         if self._store[x].singleton is None]
+
+                if retry:
+                    classifying = self._spawn(
+                        self._classify_all(daemon, retry, set()))
+
+            await sleep(_POLL_INTERVAL)
+
+    async def _classify_all(self, daemon, names, cached):
+        slots = Semaphore(_DISCOVERY_FAN_OUT)
+
+        await gather(*[self._classify(daemon, x, slots) for x in names])
+
+        # Watchers of the snapshot that are no longer forgotten. See [C1].
+        shown = [x for x in names if x in cached - daemon.forgotten]
+
+        for name in shown:
+            self._add_row(daemon, name)
+
+        self._rows_added([daemon.key(x) for x in shown])
+
+        await gather(*[self._classify(daemon, x, slots) for x in shown])
+
+        self._save(daemon)
+
+    def _restore(self, daemon):  # See [C1].
+        if self._cache is None:
+            return
+
+        try:
+            with open(_snapshot(self._cache, daemon.control)) as f:
+                snapshot = load(f)
+
+            watchers = snapshot['watchers']
+            daemon.forgotten.update(snapshot['forgotten'])
+
+        except (OSError, ValueError, KeyError):
+            return
+
+        for watcher, singleton, numprocesses, state, pids, cpu, mem in \
+                watchers:
+            self._add_row(daemon, watcher)
+
+            self._store.update(daemon.key(watcher), singleton=singleton,
+                               numprocesses=numprocesses, state=state,
+                               pids=frozenset(pids), cpu=cpu, mem=mem)
+
+        self._rows_added(list(daemon.watchers))
+
+    def _save(self, daemon):  # See [C1].
+        if self._cache is None or not daemon.synced:
+            return
+
+        path = _snapshot(self._cache, daemon.control)
+        watchers = []
+
+        for name in sorted(daemon.watchers):
+            x = self._store[name]
+
+            watchers.append([x.watcher, x.singleton, x.numprocesses, x.state,
+                             sorted(x.pids), x.cpu, x.mem])
+
+        try:
+            makedirs(self._cache, exist_ok=True)
+
+            with open(path + '.tmp', 'w') as f:
+                dump({'control': daemon.control, 'time': time(),
+                      'watchers': watchers,
+                      'forgotten': sorted(daemon.forgotten)}, f)
+
+            replace(path + '.tmp', path)
+
+        except OSError:
+            pass
+
+    async def _classify(self, daemon, name, slots):
+        async with slots:
+            conf = await self._do_request(daemon, 'options', name)
+
+        if 'options' in conf:
+            self._apply_options(daemon, name, conf['options'])
+
+    def _apply_options(self, daemon, name, options):
+        for x in options.get('forget', '').split():
+            self._forget_row(daemon, x)
+
+        if daemon.key(name) in self._store:
+            self._classify_row(daemon.key(name), options['singleton'],
+                               options.get('numprocesses'))
+
+    def _add_row(self, daemon, name):
+        if name not in daemon.forgotten:
+            self._store.add(daemon.key(name), daemon.name, name)
+
+            daemon.watchers.add(daemon.key(name))
+
+    def _classify_row(self, name, singleton, numprocesses=None):
+        self._store.update(name, singleton=bool(singleton),
+                           numprocesses=numprocesses)
+
+    def _forget_row(self, daemon, name):  # See [D2].
+        daemon.forgotten.add(name)
+
+        self._remove_row(daemon, daemon.key(name))
+
+    def _remove_row(self, daemon, name):
+        if name in self._store:
+            self._store.remove(name)
+            self._alerts.forget(name)
+
+            self._row_removed(name)
+
+        daemon.watchers.discard(name)
+
+        self._history.pop(name, None)
+        self._pid_history.pop(name, None)
+        self._processes.pop(name, None)
+        self._evented.pop(name, None)
+
+    # Poll every watcher with two requests, regardless of their number. A
+    # request without a name makes Circus reply with "statuses" and "infos"
+    # mappings for the whole fleet. Watchers missing from either mapping (or
+    # all of them, if Circus fails a bulk request) are polled one by one. A
+    # bulk request that went unanswered polls none, the daemon is down or
+    # overloaded, and the next tick tries again.
+    async def _poll_all(self, daemon):
+        states, stats = await gather(self._do_request(daemon, 'status'),
+                                     self._do_request(daemon, 'stats'))
+
+        if not states or not stats:
+            return
+
+        states = states.get('statuses', {})
+        infos = stats.get('infos', {})
+        retry = []
+
+        for name in list(daemon.watchers):
+            watcher = self._store[name].watcher
+
+            if watcher in states and isinstance(infos.get(watcher), dict):
+                self._apply_poll(name, states[watcher], infos[watcher])
+
+            else:
+                retry.append(name)
+
+        await gather(*[self._poll(x) for x in retry])
+
+    async def _poll(self, name):
+        if name not in self._store:
+            return
+
+        daemon = self._daemons[self._store[name].daemon]
+        watcher = self._store[name].watcher
+
+        state, stats = await gather(
+            self._do_request(daemon, 'status', watcher),
+            self._do_request(daemon, 'stats', watcher))
+
+        if state and 'info' in stats:
+            self._apply_poll(name, state, stats['info'])
+
+    def _apply_poll(self, name, state, info):
+        self._store.update(name, state=state,
+                           pids=frozenset(int(x) for x in info))
+
+        self._alerts.evaluate(name)
+
+    # This method:
+    #
+    #   1. Is a standard coroutine. It can run concurrently, requests are
+    #      pipelined and correlated to replies by the "mux1" multiplexer of
+    #      the daemon (see [M1]). At most "_MAX_IN_FLIGHT" requests are
+    #      outstanding at a time.
+    #
+    #   2. Writes to the DEALER socket of "mux1", which will only receive
+    #      monitoring commands.
+    #
+    #   3. Returns the "status" field of a "status" reply for a single
+    #      watcher (None on error), and the whole reply otherwise.
+    #
+    #   4. Does not return error messages. Monitoring commands are passive,
+    #      automatically issued by the program. A fail can simply be discarded,
+    #      and the GUI updates that would arise from it, bypassed. A common
+    #      error is caused by the process stopping while Circus is executing a
+    #      command on it, like "stats". Such a reply is {"status": "error"}. A
+    #      request that times out, or is not sent because Circus is
+    #      unreachable (see [M3]), has an empty reply instead.
+    #
+    async def _do_request(self, daemon, action, name=''):
+        query = {'id': uuid4().hex, 'command': action}
+
+        if name:
+            query['properties'] = {'name': name}
+
+        try:
+            self._record(daemon, _RECORD_REQUEST, query)
+
+            reply = await daemon.mux1.request(query)
+
+            self._record(daemon, _RECORD_REPLY, query, reply)
+
+        except (TimeoutError, _Unreachable):
+            return None if action == 'status' and name else {}
+
+        if action == 'status' and name:
+            return None if reply['status'] == 'error' else reply['status']
+
+        elif reply['status'] == 'ok':
+            return reply
+
+        else:
+            return {'status': 'error'}
+
+    # This method:
+    #
+    #   1. Is a coroutine that waits for its own reply only. It can run
+    #      concurrently, and often will, since it will be spawned from event
+    #      handlers attached to buttons and other GUI widgets. Commands are
+    #      pipelined by the "mux2" multiplexer of the daemon (see [M1]), so
+    #      one does not wait for the reply of another. It adopts a callback
+    #      approach to provide a reply because Tkinter event handlers cannot
+    #      await the result of a coroutine.
+    #
+    #   2. Writes to the DEALER socket of "mux2". This socket should be used
+    #      to send management commands to wachers, like stop, increment a
+    #      process etc.
+    #
+    #   3. Returns error messages. Here, actions sent to Circus come from
+    #      direct interaction with the GUI, and errors messages are expected.
+    #      That includes timeouts, and an unreachable Circus (see [M3]).
+    #
+    async def _on_reply(self, action, name, on_reply_ok, on_reply_error,
+                        **properties):
+        daemon = self._daemons[self._store[name].daemon]
+
+        self._alerts.expect(name)  # See [L4].
+
+        reply = await self._send(daemon, action,
+                                 self._store[name].watcher, **properties)
+
+        if reply['status'] == 'ok':
+            on_reply_ok(reply)
+
+            await self._poll(name)
+
+            self._alerts.expect(name)
+
+        else:
+            on_reply_error(reply['reason'].capitalize() + '.')
+
+    async def _send(self, daemon, action, watcher, **properties):
+        '''Send a management command on "mux2", and return the reply.'''
+
+        query = {'id': uuid4().hex, 'command': action}
+
+        query['properties'] = {'name': watcher}
+
+        if action == 'incr' or action == 'decr':
+            query['properties'].update({'waiting': False, 'nb': 1})
+
+        elif action in _GLOB_ACTIONS:
+            query['properties'].update({'waiting': False, 'match': 'glob'})
+
+        query['properties'].update(properties)
+
+        try:
+            self._record(daemon, _RECORD_REQUEST, query)
+
+            reply = await daemon.mux2.request(query)
+
+            self._record(daemon, _RECORD_REPLY, query, reply)
+
+        except TimeoutError:
+            return {'status': 'error', 'reason': 'timed out'}
+
+        except _Unreachable:
+            return {'status': 'error', 'reason': 'circus is unreachable'}
+
+        # Incr and decr change the number of processes. See [L2].
+        if 'numprocesses' in reply:
+            self._store.update(daemon.key(watcher),
+                               numprocesses=reply['numprocesses'])
+
+        return reply
+
+    # Circus signals either the processes or their children, so including
+    # the children takes a second command. The first failed reply, if any,
+    # is returned.
+    async def _send_signal(self, daemon, watcher, children=False,
+                           **properties):
+        commands = [self._send(daemon, 'signal', watcher, **properties)]
+
+        if children:
+            commands.append(self._send(daemon, 'signal', watcher,
+                                       children=True, **properties))
+
+        replies = await gather(*commands)
+
+        return next((x for x in replies if x['status'] != 'ok'), replies[0])
+
+    def _record(self, daemon, kind, query, reply=None):  # See [X1].
+        if daemon.record and (self._record_control or kind == _RECORD_REPLY
+                              and query['command'] in ('list', 'options')):
+            topic = '{} {}'.format(query['command'],
+                                   query.get('properties', {}).get('name', ''))
+
+            daemon.record(kind, topic.encode(), dumps(reply or query).encode())
+
+    async def _bulk(self, action, names, batch, pattern=None, **properties):
+        '''Send a command for many watchers. See [G1].'''
+
+        groups = OrderedDict()
+        calls = []
+
+        for x in names:
+            if x in self._store:
+                groups.setdefault(self._store[x].daemon, []).append(x)
+
+        for daemon, group in groups.items():
+            daemon = self._daemons[daemon]
+            glob = pattern and self._glob(daemon, pattern, group)
+
+            if glob and action in _GLOB_ACTIONS:
+                calls.append(self._bulk_send(daemon, action, glob, group,
+                                             batch, properties))
+
+            else:
+                calls.extend(self._bulk_send(daemon, action,
+                                             self._store[x].watcher, [x],
+                                             batch, properties)
+                             for x in group)
+
+        await gather(*calls)
+
+    def _glob(self, daemon, pattern, names):
+        '''A Circus glob that matches exactly the watchers named, or None.'''
+
+        watchers = {self._store[x].watcher for x in daemon.watchers}
+        selected = {self._store[x].watcher for x in names}
+        raw = pattern.replace('.', '-')
+
+        for glob in (raw, raw + '-*'):
+            matched = {x for x in watchers | daemon.forgotten
+                       if fnmatchcase(x, glob)}
+
+            if matched == selected:
+                return glob
+
+    async def _bulk_send(self, daemon, action, watcher, names, batch,
+                         properties):
+        for x in names:  # See [L4].
+            self._alerts.expect(x)
+
+        if action == 'signal':
+            reply = await self._send_signal(daemon, watcher, **properties)
+
+        else:
+            reply = await self._send(daemon, action, watcher, **properties)
+
+        if reply['status'] == 'ok':
+            await gather(*[self._poll(x) for x in names])
+
+            for x in names:
+                self._alerts.expect(x)
+
+            batch.finished(names)
+
+        else:
+            batch.finished(names, reply.get('reason', 'error'))
+
+    def _listen_deltas(self):  # See [Q1].
+        wake = partial(get_event_loop().call_soon_threadsafe,
+                       self._deltas_ready)
+
+        for x in self._daemons.values():
+            x.deltas.listen(wake)
+
+        self._deltas_ready()
+
+    def _deltas_ready(self):
+        if self._running and self._delta_handle is None:
+            delay = max(0, self._delta_time + 1 / _FRAME_RATE - monotonic())
+
+            self._delta_handle = get_event_loop().call_later(
+                delay, self._apply_deltas)
+
+    def _apply_deltas(self):  # See [Q1].
+        start = self._delta_time = monotonic()
+
+        self._delta_handle = None
+
+        for daemon in self._daemons.values():
+            connected, events, stats = daemon.deltas.take()
+
+            if connected is not None:
+                daemon.events = connected
+
+            for when, name, event, msg in events:
+                self._evented[name] = when
+
+                self._apply_event(name, event, msg, when)
+
+            for (name, pid), (when, msg) in stats.items():
+                if when < self._evented.get(name, 0):  # See [Q2].
+                    continue
+
+                elif pid is None:
+                    self._update_watcher_state_b(name, msg, when)
+
+                else:
+                    self._update_process_stats(name, pid, msg, when)
+
+        self._deltas.observe(monotonic() - start)
+
+    def _apply_event(self, name, event, msg, now):
+        if name not in self._store:
+            return
+
+        pids = self._store[name].pids
+
+        if event == 'spawn':
+            pids = pids | {int(msg['process_pid'])}
+
+            self._store.update(name, state='active', pids=pids)
+
+            self._alerts.spawned(name, now)
+
+        elif event == 'reap' or event == 'kill':
+            self._store.update(name, pids=pids - {int(msg['process_pid'])})
+
+            self._alerts.died(name)
+
+        elif event == 'start':
+            self._store.update(name, state='active')
+
+            self._alerts.expect(name)
+
+        elif event == 'stop':
+            self._store.update(name, state='stopped', pids=frozenset())
+
+            self._alerts.expect(name)
+
+        self._alerts.evaluate(name, now)
+
+    # Only records the sample, views follow the store. See [S1].
+    def _update_watcher_state_b(self, name, stats, now):
+        if 'pid' in stats and name in self._store:
+            cpu = 0 if stats['cpu'] == 'N/A' else stats['cpu'] / 100.0
+            mem = 0 if stats['mem'] == 'N/A' else stats['mem'] / 100.0
+            pids = frozenset(int(x) for x in stats['pid'])
+
+            if self._keep_history:
+                if name not in self._history:
+                    self._history[name] = _History()
+
+                self._history[name].add(now, cpu, mem, len(pids))
+
+            for x in (self._pid_history, self._processes):
+                for pid in set(x.get(name, ())) - pids:
+                    del x[name][pid]
+
+            self._store.update(name, pids=pids, cpu=cpu, mem=mem)
+
+            self._alerts.evaluate(name, now)
+
+    # The latest sample of each process is kept, and its history only with
+    # "pid_history". Views are told through "_process_changed".
+    def _update_process_stats(self, name, pid, stats, now):
+        if name in self._store and pid in self._store[name].pids:
+            cpu = 0 if stats['cpu'] == 'N/A' else stats['cpu'] / 100.0
+            mem = 0 if stats['mem'] == 'N/A' else stats['mem'] / 100.0
+            processes = self._processes.setdefault(name, {})
+
+            if self._keep_pid_history and self._keep_history:
+                history = self._pid_history.setdefault(name, {})
+
+                if pid not in history:
+                    history[pid] = _History()
+
+                history[pid].add(now, cpu, mem, 1)
+
+            if processes.get(pid) != (cpu, mem):
+                processes[pid] = (cpu, mem)
+
+                self._process_changed(name)
+
+    # NOTES
+    #
+    #   [L3] The hook command runs in a shell, with the alert in its
+    #   environment: RINGMASTER_ALERT, RINGMASTER_DAEMON, RINGMASTER_WATCHER,
+    #   RINGMASTER_VALUE and RINGMASTER_STATE ("firing" or "cleared"). At
+    #   most "_HOOK_FAN_OUT" commands run at a time, the others wait.
+    #
+    def _alert_changed(self, name, rule, value, firing):
+        if self._hook:
+            state = self._store[name]
+            variables = dict(environ, RINGMASTER_ALERT=rule.name,
+                             RINGMASTER_DAEMON=state.daemon,
+                             RINGMASTER_WATCHER=state.watcher,
+                             RINGMASTER_VALUE=str(value),
+                             RINGMASTER_STATE='firing' if firing
+                             else 'cleared')
+
+            self._spawn(self._run_hook(variables))
+
+        self._alerted(name)
+
+    async def _run_hook(self, variables):  # See [L3].
+        async with self._hooks:
+            try:
+                process = await create_subprocess_shell(
+                    self._hook, stdin=DEVNULL, env=variables)
+
+                await process.wait()
+
+            except OSError:
+                pass
+
+    # Hooks of the views, see "_Application" and "_Collector".
+    def _rows_added(self, names):
+        pass
+
+    def _row_removed(self, name):
+        pass
+
+    def _process_changed(self, name):
+        pass
+
+    def _reachable(self, name):
+        pass
+
+    def _alerted(self, name):
+        pass
+
+    # NOTES
+    #
+    #   [T2] The multiplexers, the stream protocols and the render scheduler
+    #   keep their own counters and histograms. They are gathered on demand,
+    #   and merged across daemons. Request latencies are split by command.
+    #
+    def diagnostics(self):
+        '''Counters and durations of the hot paths. See [T2].'''
+
+        requests = {}
+        daemons = OrderedDict()
+
+        for x in self._daemons.values():
+            for mux in (x.mux1, x.mux2):
+                for action, histogram in mux.latency.items():
+                    if action not in requests:
+                        requests[action] = _Histogram()
+
+                    requests[action].merge(histogram)
+
+            daemons[x.name] = {
+                'reachable': x.reachable, 'events': x.events,
+                'monitoring': x.mux1.counters(),
+                'commands': x.mux2.counters(),
+                'stats': x.ingest.counters() if x.ingest else None,
+                'deltas': x.deltas.counters()}
+
+        return OrderedDict([
+            ('time', time()),
+            ('uptime', monotonic() - self._started),
+            ('watchers', len(self._store)),
+            ('alerts', len(self._alerts.firing)),
+            ('requests', OrderedDict((k, requests[k].summary())
+                                     for k in sorted(requests))),
+            ('handlers', OrderedDict((k, v.summary())
+                                     for k, v in self._timings().items())),
+            ('daemons', daemons)])
+
+    def _timings(self):
+        ingest, events = _Histogram(), _Histogram()
+
+        for x in self._daemons.values():
+            if x.ingest:
+                ingest.merge(x.ingest.durations)
+
+            if x.feed:
+                events.merge(x.feed.durations)
+
+        return OrderedDict([('ingest', ingest), ('events', events),
+                            ('deltas', self._deltas), ('loop lag', self._lag)])
+
+# NOTES
+#
+#   [P1] Scrapes are answered from memory, and never reach Circus. The lines
+#   of each watcher are cached, and formatted again only after the store (or
+#   the per process stream) notified a change. The body is cached too, and
+#   rebuilt by the first scrape after any change. A scrape of an unchanged
+#   fleet costs a single write, however many watchers there are.
+#
+#   [P2] A minimal HTTP/1.0 server, which is enough for Prometheus. Only "GET
+#   /metrics" and "GET /diagnostics" (JSON, see [T2]) are served, and the
+#   connection is closed after the reply.
+#
+class _Collector(_Monitor):
+    '''Headless collector, with a Prometheus exporter. See [P1].'''
+
+    def __init__(self, daemons, listen, alerts=_ALERTS, hook=None,
+                 cache=_CACHE_DIR):
+        super().__init__(daemons, alerts, hook, cache)
+
+        self._keep_history = False
+        self._per_pid = True
+        self._listen = listen
+        self._stop = Future()
+        self._lines = {}
+        self._dirty = set()
+        self._body = None
+
+        self._store.subscribe(self._mark)
+
+    async def mainloop(self):
+        host, port = self._listen
+        loop = get_event_loop()
+        server = await start_server(self._serve, host, port)
+
+        for x in (SIGINT, SIGTERM):
+            loop.add_signal_handler(x, self._quit)
+
+        try:
+            while not self._stop.done():
+                start = monotonic()
+
+                await wait([self._stop], timeout=_POLL_INTERVAL)
+
+                if not self._stop.done():  # See [E2].
+                    self._lag.observe(
+                        max(0, monotonic() - start - _POLL_INTERVAL))
+
+        finally:
+            # The loop may outlive the collector, like in the benchmark.
+            for x in (SIGINT, SIGTERM):
+                loop.remove_signal_handler(x)
+
+            server.close()
+
+        await server.wait_closed()
+
+    def _quit(self):
+        super()._quit()
+
+        if not self._stop.done():
+            self._stop.set_result(None)
+
+    def _mark(self, name):
+        self._dirty.add(name)
+
+        self._body = None
+
+    def _rows_added(self, names):
+        for x in names:
+            self._mark(x)
+
+    def _row_removed(self, name):
+        self._dirty.discard(name)
+        self._lines.pop(name, None)
+
+        self._body = None
+
+    def _reachable(self, name):
+        self._body = None
+
+    def _process_changed(self, name):
+        self._mark(name)
+
+    def _alerted(self, name):
+        self._mark(name)
+
+    def _format(self, name):
+        '''Lines of a watcher, one string per family of "_METRICS".'''
+
+        state = self._store[name]
+        processes = self._processes.get(name, {})
+        labels = 'daemon="{}",watcher="{}"'.format(_escape(state.daemon),
+                                                   _escape(state.watcher))
+        lines = [''] * len(_METRICS)
+
+        lines[1] = 'circus_watcher_up{{{}}} {}\n'.format(
+            labels, int(state.state == 'active'))
+        lines[2] = 'circus_watcher_processes{{{}}} {}\n'.format(
+            labels, len(state.pids))
+
+        if state.cpu is not None:
+            lines[3] = 'circus_watcher_cpu_ratio{{{}}} {}\n'.format(
+                labels, state.cpu)
+            lines[4] = 'circus_watcher_memory_ratio{{{}}} {}\n'.format(
+                labels, state.mem)
+
+        for pid in set(processes) - state.pids:
+            del processes[pid]
+
+        for pid, (cpu, mem) in sorted(processes.items()):
+            tpl = '{}{{{},pid="{}"}} {}\n'
+
+            lines[5] += tpl.format('circus_process_cpu_ratio', labels, pid,
+                                   cpu)
+            lines[6] += tpl.format('circus_process_memory_ratio', labels,
+                                   pid, mem)
+
+        for rule in self._alerts.match(name):
+            lines[7] += 'circus_watcher_alert{{{},alert="{}"}} {}\n'.format(
+                labels, _escape(rule.name),
+                int((name, rule) in self._alerts.firing))
+
+        return lines
+
+    def _scrape(self):
+        if self._body is None:
+            for name in self._dirty:
+                if name in self._store:
+                    self._lines[name] = self._format(name)
+
+            self._dirty.clear()
+
+            parts = []
+
+            for i, (metric, kind, text) in enumerate(_METRICS):
+                parts.append('# HELP {} {}\n'.format(metric, text))
+                parts.append('# TYPE {} {}\n'.format(metric, kind))
+
+                if i == 0:
+                    for x in self._daemons.values():
+                        parts.append('{}{{daemon="{}"}} {}\n'.format(
+                            metric, _escape(x.name), int(x.reachable)))
+
+                else:
+                    parts.extend(x[i] for x in self._lines.values())
+
+            self._body = ''.join(parts).encode()
+
+        return self._body
+
+    async def _serve(self, reader, writer):  # See [P2].
+        try:
+            line = await wait_for(reader.readline(), _REQUEST_TIMEOUT)
+            method, path = (line.decode('latin-1').split() + ['', ''])[:2]
+
+            while (await wait_for(reader.readline(),
+                                  _REQUEST_TIMEOUT)).strip():
+                pass
+
+            path = path.partition('?')[0]
+
+            if method == 'GET' and path == '/metrics':
+                status, body = '200 OK', self._scrape()
+                kind = 'text/plain; version=0.0.4; charset=utf-8'
+
+            elif method == 'GET' and path == '/diagnostics':
+                status, body = '200 OK', dumps(self.diagnostics()).encode()
+                kind = 'application/json'
+
+            else:
+                status, body = '404 Not Found', b'Not Found\n'
+                kind = 'text/plain; charset=utf-8'
+
+            head = 'HTTP/1.0 {}\r\nContent-Type: {}\r\n' \
+                'Content-Length: {}\r\n\r\n'.format(status, kind, len(body))
+
+            writer.write(head.encode() + body)
+
+            await writer.drain()
+
+        except (TimeoutError, ConnectionError, ValueError):
+            pass
+
+        finally:
+            writer.close()
+
+# NOTES
+#
+#   [U1] The terminal keeps a copy of the cells it wrote on every line. A line
+#   is made of cells (a position, a padded text and an attribute), and only
+#   the cells that differ from the copy are written. Curses sends the
+#   characters that changed on "refresh", so an unchanged cell costs nothing
+#   on the wire, and a changed CPU figure costs a few bytes.
+#
+#   [U2] Like the watcher list (see [R1], and [V1] in "ringmaster_tk"), only
+#   the rows on screen are painted, at most "_TUI_FRAME_RATE" times per
+#   second. Keys are read when the terminal has input, from the event loop,
+#   and never block it.
+#
+class _Terminal(_Monitor):
+    '''Curses front end, a "top" of the watchers. See [U1].'''
+
+    def __init__(self, daemons, alerts=_ALERTS, hook=None, cache=_CACHE_DIR):
+        super().__init__(daemons, alerts, hook, cache)
+
+        self._keep_history = False
+        self._stop = Future()
+        self._render = _RenderScheduler(self._render_rows, _TUI_FRAME_RATE)
+        self._screen = None
+        self._keys = {}
+        self._attrs = {}
+        self._busy = set()
+        self._order = []
+        self._index = {}
+        self._lines = []
+        self._columns = []
+        self._message = None
+        self._stale = True
+        self._sort = 0
+        self._sorted = 0
+        self._cursor = 0
+        self._offset = 0
+        self._height = 0
+        self._width = len(_TUI_COLUMNS[0][0])
+
+        self._store.subscribe(self._render.mark)
+
+    async def mainloop(self):
+        import curses  # See [C2].
+
+        from sys import stdin
+        from locale import LC_ALL, setlocale
+        from signal import SIGWINCH
+
+        loop = get_event_loop()
+
+        setlocale(LC_ALL, '')
+
+        self._screen = curses.initscr()
+
+        try:
+            curses.noecho()
+            curses.cbreak()
+
+            self._screen.keypad(True)
+            self._screen.nodelay(True)
+            self._screen.idlok(True)
+
+            self._setup(curses)
+
+            loop.add_reader(stdin.fileno(), self._on_input)
+            loop.add_signal_handler(SIGWINCH, self._on_resize)
+
+            for x in (SIGINT, SIGTERM):
+                loop.add_signal_handler(x, self._quit)
+
+            self._on_resize()
+
+            while not self._stop.done():
+                start = monotonic()
+
+                await wait([self._stop], timeout=_POLL_INTERVAL)
+
+                if not self._stop.done():  # See [E2].
+                    self._lag.observe(
+                        max(0, monotonic() - start - _POLL_INTERVAL))
+
+        finally:
+            loop.remove_reader(stdin.fileno())
+
+            for x in (SIGWINCH, SIGINT, SIGTERM):
+                loop.remove_signal_handler(x)
+
+            self._screen.keypad(False)
+            self._screen = None
+
+            curses.nocbreak()
+            curses.echo()
+            curses.endwin()
+
+    def _setup(self, curses):
+        '''Attributes and key bindings, which need the curses module.'''
+
+        alert = curses.A_BOLD
+
+        try:
+            curses.curs_set(0)
+
+            if curses.has_colors():
+                curses.start_color()
+                curses.use_default_colors()
+                curses.init_pair(1, curses.COLOR_RED, -1)
+
+                alert = curses.color_pair(1)
+
+        except curses.error:
+            pass
+
+        self._attrs = {'title': curses.A_BOLD, 'header': curses.A_BOLD,
+                       'sorted': curses.A_BOLD | curses.A_UNDERLINE,
+                       'cursor': curses.A_REVERSE, 'busy': curses.A_DIM,
+                       'alert': alert, 'normal': curses.A_NORMAL}
+
+        self._keys = {
+            curses.KEY_UP: partial(self._move, -1),
+            curses.KEY_DOWN: partial(self._move, 1),
+            curses.KEY_PPAGE: partial(self._move, -1, True),
+            curses.KEY_NPAGE: partial(self._move, 1, True),
+            curses.KEY_HOME: partial(self._move, -inf),
+            curses.KEY_END: partial(self._move, inf),
+            curses.KEY_RESIZE: self._on_resize,
+            ord('k'): partial(self._move, -1),
+            ord('j'): partial(self._move, 1),
+            ord('<'): partial(self._resort_by, -1),
+            ord('>'): partial(self._resort_by, 1),
+            ord('+'): partial(self._command, 'incr'),
+            ord('-'): partial(self._command, 'decr'),
+            ord('s'): partial(self._command, 'start'),
+            ord('x'): partial(self._command, 'stop'),
+            ord('q'): self._quit,
+        }
+
+    def diagnostics(self):
+        result = super().diagnostics()
+        result['render'] = self._render.counters()
+
+        return result
+
+    def _timings(self):
+        result = super()._timings()
+        result['render'] = self._render.durations
+
+        return result
+
+    def _rows_added(self, names):
+        for x in names:
+            self._width = max(self._width, len(self._label(x)))
+
+            self._render.mark(x)
+
+        self._stale = True
+
+    def _row_removed(self, name):
+        self._busy.discard(name)
+
+        self._stale = True
+
+        self._render.mark(name)
+
+    def _reachable(self, name):
+        self._render.mark(name + '/')
+
+    def _alerted(self, name):
+        self._render.mark(name)
+
+    def _quit(self):
+        super()._quit()
+
+        if not self._stop.done():
+            self._stop.set_result(None)
+
+    def _on_input(self):
+        if self._stale:
+            self._resort()
+
+        while self._screen is not None:
+            key = self._screen.getch()
+
+            if key == -1:
+                break
+
+            if key in self._keys:
+                self._message = None
+
+                self._keys[key]()
+
+        self._refresh()
+
+    def _on_resize(self):
+        import curses  # See [C2].
+
+        # Resizing queues a KEY_RESIZE, which lands here again.
+        try:
+            size = get_terminal_size()
+
+            if curses.is_term_resized(size.lines, size.columns):
+                curses.resizeterm(size.lines, size.columns)
+
+            elif self._lines:
+                return
+
+        except (OSError, curses.error):
+            pass
+
+        lines, columns = self._screen.getmaxyx()
+
+        self._screen.clear()
+
+        self._lines = [None] * lines
+        self._height = max(0, lines - 3)
+
+        self._layout(columns)
+        self._resort()
+
+    def _layout(self, columns):
+        '''Positions and widths of the table columns, within the screen.'''
+
+        x = 0
+        previous, self._columns = self._columns, []
+
+        for i, (title, width, align, sort) in enumerate(_TUI_COLUMNS):
+            if i == 0:
+                width = min(self._width, max(len(title), columns // 2))
+
+            elif not width:
+                width = columns - 1 - x
+
+            width = min(width, columns - 1 - x)
+
+            if width > 0:
+                self._columns.append((x, width, align))
+
+            x += width + 1
+
+        # Cells moved, clear every line on the next paint.
+        if self._columns != previous:
+            self._lines = [None] * len(self._lines)
+
+    def _label(self, name):
+        state = self._store[name]
+
+        if len(self._daemons) > 1:
+            return state.daemon + '/' + _DOT(state.watcher)
+
+        return _DOT(state.watcher)
+
+    def _move(self, count, pages=False):
+        if pages:
+            count *= max(1, self._height)
+
+        self._cursor = max(0, min(self._cursor + count, len(self._order) - 1))
+
+    def _resort_by(self, step):
+        self._sort = (self._sort + step) % len(_SORTS)
+
+        self._resort()
+
+    def _resort(self):
+        key = _SORTS[self._sort][1]
+        rank = {x: i for i, x in enumerate(self._daemons)}
+        store = self._store
+        cursor = self._order[self._cursor] if self._order else None
+
+        # Watchers are grouped by daemon, like in the window. See [V3], in
+        # "ringmaster_tk".
+        self._order = sorted(store, key=lambda x: (rank[store[x].daemon],
+                                                   key(store[x])))
+        self._index = {x: i for i, x in enumerate(self._order)}
+        self._cursor = self._index.get(cursor, self._cursor)
+        self._stale = False
+        self._sorted = monotonic()
+
+        if self._columns and self._columns[0][1] < self._width:
+            self._layout(self._screen.getmaxyx()[1])
+
+        self._move(0)
+        self._refresh()
+
+    def _render_rows(self, names):  # See [U2].
+        by_name = self._sort == 0
+
+        if self._screen is None:
+            return
+
+        elif self._stale or not by_name and \
+                monotonic() - self._sorted > _RESORT_INTERVAL:
+            self._resort()
+
+        else:
+            for name in names:
+                i = self._index.get(name)
+
+                if i is not None and 0 <= i - self._offset < self._height:
+                    self._paint_row(2 + i - self._offset, name)
+
+            self._paint_frame()
+
+            self._screen.refresh()
+
+    def _refresh(self):
+        '''Paint every line of the screen.'''
+
+        if self._screen is None:
+            return
+
+        if self._cursor < self._offset:
+            self._offset = self._cursor
+
+        elif self._cursor >= self._offset + self._height:
+            self._offset = self._cursor - self._height + 1
+
+        names = self._order[self._offset:self._offset + self._height]
+
+        for i, name in enumerate(names):
+            self._paint_row(2 + i, name)
+
+        for y in range(2 + len(names), len(self._lines) - 1):
+            self._line(y, [])
+
+        self._paint_frame()
+
+        self._screen.refresh()
+
+    def _paint_frame(self):
+        '''Paint the title, the table header and the status line.'''
+
+        down = sum(1 for x in self._daemons.values() if not x.reachable)
+        title = '{} watchers'.format(len(self._order))
+        columns = self._screen.getmaxyx()[1] - 1
+        header = self._cells([x[0] for x in _TUI_COLUMNS], 'header')
+        sort = _SORTS[self._sort][0]
+
+        if len(self._daemons) == 1 and down:
+            title += ' (unreachable)'
+
+        elif down:
+            title += ' ({} of {} unreachable)'.format(down, len(self._daemons))
+
+        if self._alerts.firing:
+            title += ', {} alerts'.format(len(self._alerts.firing))
+
+        self._line(0, [(0, title[:columns].ljust(columns),
+                        self._attrs['alert' if down else 'title'])])
+
+        for i, (x, text, attr) in enumerate(header):
+            if _TUI_COLUMNS[i][3] == sort:
+                header[i] = (x, text, self._attrs['sorted'])
+
+        self._line(1, header)
+
+        if self._message:
+            status = [(0, self._message[:columns].ljust(columns),
+                       self._attrs['alert'])]
+
+        else:
+            position = ' {}/{}'.format(
+                self._cursor + 1 if self._order else 0, len(self._order))
+            keys = _TUI_HELP[:max(0, columns - len(position))]
+
+            status = [(0, keys.ljust(columns - len(position)),
+                       self._attrs['normal']),
+                      (max(0, columns - len(position)),
+                       position[:columns], self._attrs['normal'])]
+
+        self._line(len(self._lines) - 1, status)
+
+    def _paint_row(self, y, name):
+        state = self._store[name]
+        procs = len(state.pids)
+        firing = [x.name for x in self._alerts.match(name)
+                  if (name, x) in self._alerts.firing]
+
+        if state.singleton is None:
+            values = [self._label(name), '…', '', '', '', '']
+
+        elif procs and state.cpu is not None:
+            values = [self._label(name), state.state, str(procs),
+                      '{:.1%}'.format(state.cpu), '{:.1%}'.format(state.mem),
+                      ','.join(firing)]
+
+        else:
+            values = [self._label(name), state.state, str(procs), '–', '–',
+                      ','.join(firing)]
+
+        attr = self._attrs['alert' if firing else 'normal']
+
+        if name in self._busy:
+            attr |= self._attrs['busy']
+
+        if self._index.get(name) == self._cursor:
+            attr |= self._attrs['cursor']
+
+        self._line(y, self._cells(values, attr))
+
+    def _cells(self, values, attr):
+        '''Cells of a table line, padded to the width of their column.'''
+
+        if isinstance(attr, str):
+            attr = self._attrs[attr]
+
+        return [(x, '{:{}{}}'.format(value[:width], align, width), attr)
+                for (x, width, align), value in zip(self._columns, values)]
+
+    def _line(self, y, cells):  # See [U1].
+        '''Write the cells of a line that differ from those on screen.'''
+
+        last = self._lines[y]
+
+        if last is None or len(last) != len(cells):
+            self._screen.move(y, 0)
+            self._screen.clrtoeol()
+
+            last = [None] * len(cells)
+
+        for cell, previous in zip(cells, last):
+            if cell != previous:
+                self._screen.addstr(y, cell[0], cell[1], cell[2])
+
+        self._lines[y] = cells
+
+    # Like the buttons of a row in the window, see "_update_watcher_state_a".
+    def _command(self, action):
+        if not self._order:
+            return
+
+        name = self._order[self._cursor]
+        state = self._store[name]
+
+        def ok(reply):
+            self._busy.discard(name)
+
+            self._render.mark(name)
+
+        def error(message):
+            self._busy.discard(name)
+            self._message = '{}: {}'.format(self._label(name), message)
+
+            self._render.mark(name)
+
+        if name in self._busy or state.singleton is None:
+            return
+
+        elif state.singleton and action in ('incr', 'decr'):
+            self._message = '{} is a singleton.'.format(self._label(name))
+
+            return
+
+        elif action == 'incr' and state.state == 'stopped':
+            action = 'start'
+
+        elif action == 'decr' and not state.pids:
+            return
+
+        self._busy.add(name)
+
+        self._render.mark(name)
+
+        self._spawn(self._on_reply(action, name, ok, error))
+
+# NOTES
+#
+#   [Y2] The loop implementation is chosen through the event loop policy, so
+#   that the loop of the ingest thread (see [Q1]) is of the same kind as the
+#   main one. aiozmq watches its sockets with "add_reader", which uvloop
+#   implements too. Tk runs in "mainloop", whatever the loop. The asyncio
+#   loop of the window waits in Tk, through a selector of "ringmaster_tk".
+#
+def _event_loop(name='asyncio', selector=None):
+    '''Install a new event loop, of one of "_LOOPS", and return it. An
+    asyncio loop uses "selector", if given.'''
+
+    if name == 'uvloop':
+        import uvloop  # See [C2].
+
+        set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    else:
+        set_event_loop_policy(None)
+
+    if name != 'uvloop' and selector is not None:
+        loop = SelectorEventLoop(selector)
+
+    else:
+        loop = new_event_loop()
+
+    set_event_loop(loop)
+
+    return loop
+
+def _escape(value):
+    '''Escape a Prometheus label value.'''
+
+    return value.replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+def _alert(parser, name, section):
+    '''An alert rule from a config section. See [L1].'''
+
+    number = lambda x: float(x[:-1]) / 100 if x.endswith('%') else float(x)
+
+    try:
+        metric = section['metric']
+        threshold = number(section['above'])
+        clear = number(section.get('clear', section['above']))
+        seconds = float(section.get('for', '0'))
+
+    except (KeyError, ValueError) as e:
+        parser.error('invalid alert rule {}: {}'.format(name, e))
+
+    if metric not in _ALERT_METRICS:
+        parser.error('unknown metric {} in {}'.format(metric, name))
+
+    return (name.partition(':')[2], metric, threshold, min(clear, threshold),
+            seconds, section.get('watchers', '*'))
+
+def _arguments(argv=None):
+    '''Parse the command line. Daemon endpoints are in "daemons".'''
+
+    parser = ArgumentParser(prog='ringmaster',
+                            description='Circus Tcl/Tk control panel.')
+
+    parser.add_argument('endpoints', nargs='*',
+                        metavar='CONTROL[,STATS[,PUBSUB]]',
+                        help='endpoints of a Circus daemon, tcp:// or ipc://')
+    parser.add_argument('-c', '--config', metavar='FILE',
+                        help='read daemon endpoints from an INI file, with '
+                             'a section per daemon, and "control", "stats" '
+                             'and "pubsub" keys, and alert rules, with an '
+                             '"alert:NAME" section per rule')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without a GUI, and export metrics over '
+                             'HTTP, in the Prometheus text format')
+    parser.add_argument('--tui', action='store_true',
+                        help='run in the terminal, instead of a window')
+    parser.add_argument('--listen', metavar='HOST:PORT',
+                        default=_METRICS_ADDR,
+                        help='address of the metrics endpoint, in headless '
+                             'mode (default: {})'.format(_METRICS_ADDR))
+    parser.add_argument('--hook', metavar='COMMAND',
+                        help='run a shell command when an alert fires or '
+                             'clears')
+    parser.add_argument('--loop', choices=_LOOPS, default=_LOOPS[0],
+                        help='event loop implementation (default: '
+                             '{})'.format(_LOOPS[0]))
+    parser.add_argument('--pid-history', action='store_true',
+                        default=_PID_HISTORY,
+                        help='keep the history of each process too, shown '
+                             'in the details dialog')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not draw the watchers from the snapshot of '
+                             'the last run, nor save a snapshot')
+    parser.add_argument('--record', metavar='PATH',
+                        help='record the streams to files PATH.0001, '
+                             'PATH.0002 and so on, rotated by size')
+    parser.add_argument('--record-control', action='store_true',
+                        help='record control requests and replies too')
+    parser.add_argument('--replay', metavar='PATH',
+                        help='replay a recording (a file, or the PATH of '
+                             '--record), instead of connecting to Circus')
+    parser.add_argument('--speed', metavar='FACTOR', type=float, default=1.0,
+                        help='replay speed, 0 is as fast as possible '
+                             '(default: 1)')
+    parser.add_argument('--seek', metavar='SECONDS', type=float, default=0.0,
+                        help='start the replay this far into the recording')
+
+    args = parser.parse_args(argv)
+    daemons = []
+    alerts = []
+    host, __, port = args.listen.rpartition(':')
+
+    if not port.isdigit():
+        parser.error('invalid address {}'.format(args.listen))
+
+    if args.config:
+        from configparser import ConfigParser  # See [C2].
+
+        config = ConfigParser(interpolation=None)
+
+        if not config.read(args.config):
+            parser.error('cannot read {}'.format(args.config))
+
+        for name in config.sections():
+            if name.startswith('alert:'):
+                alerts.append(_alert(parser, name, config[name]))
+
+                continue
+
+            if 'control' not in config[name]:
+                parser.error('daemon {} has no control endpoint'.format(name))
+
+            control = config[name]['control']
+            stats, pubsub = _endpoints(control)
+            stats = config[name].get('stats', stats)
+            pubsub = config[name].get('pubsub', pubsub)
+
+            daemons.append((name, control, stats, pubsub))
+
+    for x in args.endpoints:
+        control, stats, pubsub = (x.split(',') + [None, None])[:3]
+        default = _endpoints(control)
+
+        daemons.append((control.partition('://')[2], control,
+                        stats or default[0], pubsub or default[1]))
+
+    if not daemons:
+        daemons.append((_CIRCUS_CONTROL_ADDR.partition('://')[2],
+                        _CIRCUS_CONTROL_ADDR, _CIRCUS_STATS_ADDR,
+                        _CIRCUS_PUBSUB_ADDR))
+
+    if len(set(x[0] for x in daemons)) != len(daemons):
+        parser.error('daemon names must be unique')
+
+    if args.headless and args.tui:
+        parser.error('--headless and --tui are exclusive')
+
+    from importlib.util import find_spec  # See [C2].
+
+    if args.loop != 'asyncio' and find_spec(args.loop) is None:
+        parser.error('{} is not installed'.format(args.loop))
+
+    # Like tkinter, curses is not in every Python build. See [C3].
+    if args.tui and find_spec('_curses') is None:
+        parser.error('--tui needs a Python with curses')
+
+    if args.replay and args.record:
+        parser.error('--record and --replay are exclusive')
+
+    elif args.replay:
+        try:
+            args.recording = _Recording(args.replay)
+
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+
+        daemons = args.recording.daemons
+
+    args.daemons = daemons
+    args.alerts = alerts or _ALERTS
+    args.listen = (host or None, int(port))
+
+    return args
+
+def main():
+    args = _arguments()
+    selector = None
+
+    if not (args.headless or args.tui):
+        from ringmaster_tk import _Application, _TkSelector
+
+        # Only an asyncio loop waits in Tk. See [Y2].
+        if args.loop == 'asyncio':
+            selector = _TkSelector()
+
+    loop = _event_loop(args.loop, selector)
+
+    cache = None if args.no_cache else _CACHE_DIR
+
+    if args.headless:
+        root = _Collector(args.daemons, args.listen, args.alerts, args.hook,
+                          cache)
+
+    elif args.tui:
+        root = _Terminal(args.daemons, args.alerts, args.hook, cache)
+
+    else:
+        root = _Application(args.daemons, alerts=args.alerts, hook=args.hook,
+                            cache=cache, selector=selector,
+                            pid_history=args.pid_history)
+
+    if args.record:
+        recorder = _Recorder(args.record, args.daemons)
+
+        root.record(recorder, args.record_control)
+
+    if args.replay:
+        root._spawn(root.replay(args.recording, args.speed, args.seek))
+
+    else:
+        loop.run_until_complete(root.setup())
+
+        root._spawn(root.paint())
+
+    try:
+        loop.run_until_complete(root.mainloop())
+
+    finally:
+        root._quit()
+
+        loop.run_until_complete(root.shutdown())
+
+        root.close()
+
+        if args.record:
+            recorder.close()
+
+        # Let the transports close.
+        loop.run_until_complete(sleep(0))
+        loop.close()
+
+if __name__ == '__main__':
+    from ringmaster import main  # See [C3].
 
-if __name__ == '__main__':
     main()
@@ -0,0 +1,1560 @@
+# -*- coding: utf-8; -*-
+#
+# Ringmaster – The Tcl/Tk window. It is only imported for the window mode, so
+# that the monitoring core in "ringmaster.py" runs without tkinter. See [C3]
+# there, and the notes of the classes this window builds on.
+#
+# NOTES
+#
+#   [LEAK] This program has a memory leak in OS X. Memory consumption increases
+#   over time, and is proportional to the frequency of invocation of methods
+#   "_update_watcher_state_a" and "_update_watcher_state_b" of the application
+#   class, which only perform Tkinter operations. This leads me to believe that
+#   the problem is either in Tcl/Tk, or Tkinter itself.
+#
+#     http://stackoverflow.com/questions/22143622
+#
+#   [LEAK2] Test if a watcher's process list has changed before calling the
+#   "_update_watcher_state_a" method. This will mitigate memory leakage. The
+#   watcher store only notifies actual changes, see [S1].
+#
+
+# Python.
+from json import dumps
+from math import ceil
+from time import localtime, monotonic, strftime
+from fnmatch import fnmatchcase
+from asyncio import Future, wait
+from tkinter import BooleanVar, Canvas, Text, Toplevel, Tk, StringVar, \
+    ttk, font
+from _tkinter import ALL_EVENTS, DONT_WAIT, READABLE
+from functools import partial
+from selectors import DefaultSelector
+
+# Ringmaster.
+from ringmaster import _ALERTS, _ALERT_ROWS, _Batch, _CACHE_DIR, \
+    _DIAGNOSTICS_INTERVAL, _DOT, _HISTORY, _Histogram, _Monitor, \
+    _NAMESPACE_TREE, _Namespaces, _PID_HISTORY, _PROCESS_ROWS, \
+    _PROCESS_SORTS, _RESORT_INTERVAL, _RenderScheduler, _SIGNALS, _SORTS, \
+    _SPARK_SAMPLES, _SPARK_SIZE, _TITLE, _TK_INTERVAL_MAX, _TK_INTERVAL_MIN, \
+    _VISIBLE_ROWS
+
+def _config(widget, **options):
+    '''Configure a widget with the options whose values have changed.'''
+
+    cache = widget.__dict__.setdefault('_r_config', {})
+    delta = {k: v for k, v in options.items() if cache.get(k) != v}
+
+    if delta:
+        cache.update(delta)
+
+        widget.config(**delta)
+
+def _bind(widget, handler):
+    '''Set (or clear, if None) the click handler of a widget. The widget is
+    bound once, to a dispatcher, so that no Tcl command is created per call.
+    See [LEAK].'''
+
+    if '_r_bind' not in widget.__dict__:
+        widget.bind('<Button-1>', _click)
+
+    widget._r_bind = handler
+
+def _click(event):
+    '''Dispatch a click to the current handler of the widget.'''
+
+    handler = event.widget.__dict__.get('_r_bind')
+
+    if handler:
+        return handler(event)
+
+def _span(seconds):
+    '''Format a duration, like "10 min" or "24 h".'''
+
+    if seconds >= 3600:
+        return '{:g} h'.format(seconds / 3600)
+
+    elif seconds >= 60:
+        return '{:g} min'.format(seconds / 60)
+
+    else:
+        return '{:g} s'.format(seconds)
+
+def _polyline(values, scale, width, height):
+    '''Canvas coordinates of a line plot of values, skipping NaNs.'''
+
+    step = width / max(len(values) - 1, 1)
+    points = []
+
+    for i, x in enumerate(values):
+        if x == x:
+            points.extend((i * step, height - 1 - x / scale * (height - 2)))
+
+    return points if len(points) >= 4 else [-1, -1, -1, -1]
+
+def _coords(canvas, item, points):
+    '''Move a canvas item, unless it is already in place.'''
+
+    cache = canvas.__dict__.setdefault('_r_coords', {})
+
+    if cache.get(item) != points:
+        cache[item] = points
+
+        canvas.coords(item, *points)
+
+class _WatcherRow:
+    '''Widgets of a recyclable row of the watcher list.'''
+
+    def __init__(self, parent, i):
+        self.i = i
+        self.kind = None
+        self.lb1 = ttk.Label(parent)
+        self.lb2 = ttk.Label(parent, anchor='center', width=25)
+        self.bt1 = ttk.Button(parent)
+        self.bt2 = ttk.Button(parent, text='Decr')
+        self.bt3 = ttk.Button(parent, text=' +', width=3)
+        self.spark = Canvas(parent, width=_SPARK_SIZE[0],
+                            height=_SPARK_SIZE[1], highlightthickness=0)
+        self.cpu = self.spark.create_line(-1, -1, -1, -1, fill='darkgreen')
+        self.mem = self.spark.create_line(-1, -1, -1, -1, fill='steelblue')
+
+        for x in (self.lb1, self.lb2, self.spark, self.bt1, self.bt2,
+                  self.bt3):
+            x.bindtags(x.bindtags() + ('WatcherList',))
+
+    def layout(self, kind):
+        '''Grid the widgets as a "singleton", "normal", "group", "header" or
+        "hidden" row.'''
+
+        if kind == self.kind:
+            return
+
+        self.kind = kind
+
+        for x in (self.lb1, self.lb2, self.spark, self.bt1, self.bt2,
+                  self.bt3):
+            x.grid_remove()
+
+        if kind == 'hidden':
+            return
+
+        elif kind == 'header':
+            self.lb1.grid(row=self.i, column=0, columnspan=3, sticky='EW')
+
+            return
+
+        self.lb1.grid(row=self.i, column=0, columnspan=1, sticky='EW')
+        self.lb2.grid(row=self.i, column=1)
+
+        if kind == 'group':
+            return
+
+        self.spark.grid(row=self.i, column=2, padx=(0, 5))
+        self.bt3.grid(row=self.i, column=5)
+
+        if kind == 'singleton':
+            self.bt1.grid(row=self.i, column=3, columnspan=2, sticky='EW')
+
+        else:
+            self.bt1.grid(row=self.i, column=3, columnspan=1, sticky='')
+            self.bt2.grid(row=self.i, column=4)
+
+# NOTES
+#
+#   [V1] The list only has widgets for the rows that fit on screen. They are
+#   painted with whatever watchers are under the scrolled window, and are
+#   repainted on scroll, sort or resize. Updates to watchers off screen cost
+#   nothing but the write to the watcher store.
+#
+#   [V3] With more than one daemon, the watchers of each one are grouped under
+#   a header row, whatever the sort order. Header rows are named after their
+#   daemon, with a trailing slash.
+#
+#   [V2] The size of a row is measured once the first rows are painted. From
+#   then on, the body of the list does not follow the size of its content,
+#   but that of the window, and the number of rows follows the body height.
+#   Watchers added later (by another daemon, or a replay) still grow the
+#   list, up to "_VISIBLE_ROWS" rows. Header rows count, the first daemon
+#   may have no watchers at all.
+#
+class _WatcherList(ttk.Frame):
+    '''Virtualized, scrollable and sortable list of watchers. See [V1].'''
+
+    def __init__(self, parent, application):
+        super().__init__(parent, name='frame')
+
+        self._app = application
+        self._names = []
+        self._order = []
+        self._shown = {}
+        self._rows = []
+        self._count = 0
+        self._offset = 0
+        self._height = 0
+        self._width = 0
+        self._sorted = 0
+        self._sort = StringVar(self, _SORTS[0][0])
+        self._tree = BooleanVar(self, _NAMESPACE_TREE)
+
+        header = ttk.Frame(self)
+        self._body = ttk.Frame(self)
+        self._scroll = ttk.Scrollbar(self, command=self._yview)
+
+        for i, (text, key) in enumerate(_SORTS):
+            btn = ttk.Radiobutton(header, text=text, value=text,
+                                  variable=self._sort, command=self._resort,
+                                  style='Toolbutton')
+
+            btn.grid(row=0, column=i)
+
+        tree = ttk.Checkbutton(header, text='Tree', variable=self._tree,
+                               command=self._resort, style='Toolbutton')
+
+        tree.grid(row=0, column=len(_SORTS), padx=(10, 0))
+
+        header.grid(row=0, column=0, sticky='W', pady=(0, 5))
+        self._body.grid(row=1, column=0, sticky='NSEW')
+        self._scroll.grid(row=1, column=1, sticky='NS')
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self._body.bindtags(self._body.bindtags() + ('WatcherList',))
+        self._body.bind('<Configure>', self._on_configure)
+
+        self.bind_class('WatcherList', '<MouseWheel>', self._on_wheel)
+        self.bind_class('WatcherList', '<Button-4>', self._on_wheel)
+        self.bind_class('WatcherList', '<Button-5>', self._on_wheel)
+
+    def extend(self, names):
+        self._names.extend(names)
+
+        for x in names:
+            self._width = max(self._width,
+                              len(_DOT(self._app._store[x].watcher)))
+
+        self._resort()
+
+        count = min(len(self._order), _VISIBLE_ROWS)
+
+        if not self._height and self._order:
+            self._measure()
+
+        elif self._height and self._count < count:
+            self._grow(count)
+
+            self._body.config(height=self._height * count)
+
+            self._refresh()
+
+    def remove(self, name):
+        if name in self._names:
+            self._names.remove(name)
+
+            self._resort()
+
+    def toggle(self, group, event=None):  # See [W2].
+        '''Expand or collapse a namespace.'''
+
+        group = self._app._tree.groups.get(group)
+
+        if group is not None:
+            group.collapsed = not group.collapsed
+
+            self._resort()
+
+    def render(self, names):
+        '''Repaint the rows on screen whose watchers changed.'''
+
+        by_name = self._sort.get() == _SORTS[0][0]
+
+        if not by_name and monotonic() - self._sorted > _RESORT_INTERVAL:
+            self._resort()
+
+        else:
+            for name in names:
+                if name in self._shown:
+                    self._paint(self._shown[name], name)
+
+    def _measure(self):  # See [V2].
+        # Daemon headers count as rows, there may be no watchers yet.
+        self._grow(min(len(self._order), _VISIBLE_ROWS))
+        self._refresh()
+
+        self.update_idletasks()
+
+        x, y, w, h = self._body.grid_bbox()
+
+        # Collapsed groups may leave rows hidden.
+        self._height = h // max(1, min(len(self._rows), len(self._order)))
+
+        self._body.config(width=w, height=self._height * len(self._rows))
+        self._body.grid_propagate(False)
+
+    def _grow(self, count):
+        while len(self._rows) < count:
+            self._rows.append(_WatcherRow(self._body, len(self._rows)))
+
+        self._count = count
+
+    def _paint(self, row, name):
+        tree = self._app._tree if self._tree.get() else None
+
+        if name.endswith('/'):
+            self._app._paint_header(row, name[:-1])
+
+        elif tree and name in tree.groups:
+            _config(row.lb1, width=self._width)
+
+            self._app._paint_group(row, name, tree.label(name))
+
+        else:
+            _config(row.lb1, width=self._width)
+
+            self._app._update_watcher_state_a(
+                row, name, tree.label(name) if tree else None)
+
+    def _resort(self):  # See [V3].
+        key = dict(_SORTS)[self._sort.get()]
+        store = self._app._store
+        daemons = self._app._daemons
+        groups = {x: [] for x in daemons}
+        tree = self._tree.get()
+
+        for x in sorted((x for x in self._names if x in store and not tree),
+                        key=lambda x: key(store[x])):
+            groups[store[x].daemon].append(x)
+
+        self._order = []
+
+        for x in daemons:
+            if len(daemons) > 1:
+                self._order.append(x + '/')
+
+            if tree:
+                self._order.extend(self._app._tree.flatten(x, key))
+
+            else:
+                self._order.extend(groups[x])
+
+        self._sorted = monotonic()
+
+        self._refresh()
+
+    def _refresh(self):
+        count = min(self._count, len(self._order))
+        total = len(self._order) or 1
+
+        self._offset = max(0, min(self._offset, len(self._order) - count))
+        self._shown = {}
+
+        names = self._order[self._offset:self._offset + count]
+
+        for row, name in zip(self._rows, names):
+            self._shown[name] = row
+
+            self._paint(row, name)
+
+        for row in self._rows[len(names):]:
+            row.layout('hidden')
+
+        self._scroll.set(self._offset / total, (self._offset + count) / total)
+
+    def _yview(self, *args):
+        if args[0] == 'moveto':
+            self._offset = int(float(args[1]) * len(self._order))
+
+        elif args[2] == 'pages':
+            self._offset += int(args[1]) * self._count
+
+        else:
+            self._offset += int(args[1])
+
+        self._refresh()
+
+    def _on_configure(self, event):
+        if self._height and event.height // self._height != self._count:
+            self._grow(max(1, event.height // self._height))
+            self._refresh()
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self._yview('scroll', -3, 'units')
+
+        else:
+            self._yview('scroll', 3, 'units')
+
+# NOTES
+#
+#   [K1] Like the watcher list (see [V1]), the process table only has widgets
+#   for the rows on screen, "_PROCESS_ROWS" of them. The rows of dead
+#   processes are painted with the next processes in order. The table is
+#   repainted by the painter of the dialog, which runs at most once per
+#   frame (see [R1]), and is sorted by a stat every "_RESORT_INTERVAL".
+#
+#   [K2] Per process stats come from the "stat.<watcher>.<pid>" topics. These
+#   are only decoded while a details dialog is open. See [I1].
+#
+class _ProcessTable(ttk.Frame):
+    '''Virtualized, sortable table of the processes of a watcher. See [K1].'''
+
+    def __init__(self, parent, application, watcher, command):
+        super().__init__(parent)
+
+        self._app = application
+        self._watcher = watcher
+        self._command = command
+        self._pids = None
+        self._order = []
+        self._rows = []
+        self._offset = 0
+        self._sorted = 0
+        self._sort = StringVar(self, _PROCESS_SORTS[0][0])
+
+        self.selected = None
+
+        self._scroll = ttk.Scrollbar(self, command=self._yview)
+
+        ttk.Style(self).configure('Selected.TLabel',
+                                  background='lightsteelblue')
+
+        for i, (text, key) in enumerate(_PROCESS_SORTS):
+            btn = ttk.Radiobutton(self, text=text, value=text,
+                                  variable=self._sort, command=self._resort,
+                                  style='Toolbutton')
+
+            btn.grid(row=0, column=i, sticky='EW', pady=(0, 5))
+
+            self.columnconfigure(i, weight=1, uniform='column')
+
+        for i in range(_PROCESS_ROWS):
+            row = [ttk.Label(self, width=10), ttk.Label(self, anchor='e'),
+                   ttk.Label(self, anchor='e')]
+
+            for j, x in enumerate(row):
+                x.grid(row=i + 1, column=j, sticky='EW')
+
+                x.bindtags(x.bindtags() + ('ProcessTable',))
+                x.bind('<Button-1>', partial(self._select, i))
+
+            self._rows.append(row)
+
+        self._scroll.grid(row=1, column=len(_PROCESS_SORTS),
+                          rowspan=_PROCESS_ROWS, sticky='NS')
+
+        self.bind_class('ProcessTable', '<MouseWheel>', self._on_wheel)
+        self.bind_class('ProcessTable', '<Button-4>', self._on_wheel)
+        self.bind_class('ProcessTable', '<Button-5>', self._on_wheel)
+
+    def render(self):
+        pids = self._app._store[self._watcher].pids
+        by_pid = self._sort.get() == _PROCESS_SORTS[0][0]
+
+        if self.selected is not None and self.selected not in pids:
+            self.selected = None
+
+            self._command()
+
+        if pids != self._pids:
+            self._pids = pids
+
+            self._resort()
+
+        elif not by_pid and monotonic() - self._sorted > _RESORT_INTERVAL:
+            self._resort()
+
+        else:
+            self._refresh()
+
+    def _sample(self, pid):
+        processes = self._app._processes.get(self._watcher, {})
+
+        return (pid,) + processes.get(pid, (None, None))
+
+    def _resort(self):
+        key = dict(_PROCESS_SORTS)[self._sort.get()]
+
+        self._order = sorted(self._pids or (),
+                             key=lambda x: key(self._sample(x)))
+        self._sorted = monotonic()
+
+        self._refresh()
+
+    def _refresh(self):
+        total = len(self._order) or 1
+
+        self._offset = max(0, min(self._offset,
+                                  len(self._order) - _PROCESS_ROWS))
+
+        for i, row in enumerate(self._rows):
+            if self._offset + i < len(self._order):
+                pid, cpu, mem = self._sample(self._order[self._offset + i])
+                style = 'Selected.TLabel' if pid == self.selected else ''
+                texts = (pid, '-' if cpu is None else '{:.1%}'.format(cpu),
+                         '-' if mem is None else '{:.1%}'.format(mem))
+
+            else:
+                style, texts = '', ('', '', '')
+
+            for x, text in zip(row, texts):
+                _config(x, text=text, style=style)
+
+        self._scroll.set(self._offset / total,
+                         min(1, (self._offset + _PROCESS_ROWS) / total))
+
+    def _select(self, i, event):
+        if self._offset + i < len(self._order):
+            pid = self._order[self._offset + i]
+
+            self.selected = None if pid == self.selected else pid
+
+            self._refresh()
+            self._command()
+
+    def _yview(self, *args):
+        if args[0] == 'moveto':
+            self._offset = int(float(args[1]) * len(self._order))
+
+        elif args[2] == 'pages':
+            self._offset += int(args[1]) * _PROCESS_ROWS
+
+        else:
+            self._offset += int(args[1])
+
+        self._refresh()
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self._yview('scroll', -3, 'units')
+
+        else:
+            self._yview('scroll', 3, 'units')
+
+class _Dialog(Toplevel):
+    '''Watcher details dialog.'''
+
+    def __init__(self, parent, watcher):
+        super().__init__(parent)
+
+        self._parent = parent
+        self._watcher = watcher
+        self._painter = self._paint()
+
+        # Decode the per process stats while open. See [K2].
+        self._parent._per_pid = True
+
+        self._painter.send(None)
+
+        # Need to call "self.update_idletasks" before "self._center".
+        self.update_idletasks()
+
+        # Center the dialog within the application window.
+        self.geometry('+{}+{}'.format(*self._center()))
+
+        # Disable resizing.
+        self.resizable(False, False)
+
+        # Make sure an explicit close is handled by "self._close".
+        self.protocol('WM_DELETE_WINDOW', self._close)
+
+        # Make sure the Escape key will trigger "self._close".
+        self.bind('<Escape>', self._close)
+
+        # Set transient (no icon in the window manager, etc).
+        self.transient(parent)
+
+        # Set modal – takes all input from all other windows.
+        self.grab_set()
+
+        # Focus on the dialog itself.
+        self.focus_set()
+
+    def _paint(self):
+        outer = ttk.Frame(self, padding=(10, 10, 10, 10))
+        title = ttk.Label(outer, text='+ ' + _DOT(
+            self._parent._store[self._watcher].watcher))
+        close = ttk.Button(outer, text='Close', command=self._close)
+        signals = ttk.Frame(outer)
+        chart = ttk.Frame(outer)
+
+        self._table = _ProcessTable(outer, self._parent, self._watcher,
+                                    self._selected)
+        self._target = ttk.Label(signals)
+        self._status = ttk.Label(signals, foreground='grey')
+        self._children = BooleanVar(self, False)
+
+        self.title('')
+
+        for i, x in enumerate(_SIGNALS):
+            btn = ttk.Button(signals, text=x, width=5,
+                             command=partial(self._signal, x))
+
+            btn.grid(row=1, column=i)
+
+        children = ttk.Checkbutton(signals, text='Children',
+                                   variable=self._children)
+
+        self._target.grid(row=0, column=0, columnspan=4, sticky='W')
+        children.grid(row=0, column=4, columnspan=3, sticky='E')
+        self._status.grid(row=2, column=0, columnspan=7, sticky='W')
+
+        outer.grid(row=0, column=0, sticky='NSEW')
+        title.grid(row=0, column=0, pady=(0, 10))
+        self._table.grid(row=1, column=0, sticky='EW')
+        signals.grid(row=2, column=0, pady=(5, 0))
+        chart.grid(row=3, column=0, sticky='EW', pady=(10, 0))
+        close.grid(row=4, column=0, sticky='EW', pady=(10, 0))
+
+        title.config(font='-size 16')
+
+        self._chart(chart)
+
+        self._selected()
+
+        while self._parent._running:
+            self._table.render()
+
+            self._plot()
+
+            yield
+
+    # Signals go to the process selected in the table, or to all of them.
+    # The chart follows the selection, with per process history.
+    def _selected(self):
+        if self._table.selected is None:
+            _config(self._target, text='Signal all processes')
+
+        else:
+            _config(self._target, text='Signal process {}'.format(
+                self._table.selected))
+
+        self._plot()
+
+    def _chart(self, frame):
+        self._tier = StringVar(self, '0')
+        self._canvas = Canvas(frame, width=420, height=120, background='white')
+        self._lines = []
+
+        for i, (color, text) in enumerate([('darkgreen', 'cpu'),
+                                           ('steelblue', 'mem'),
+                                           ('orange', 'processes')]):
+            line = self._canvas.create_line(-1, -1, -1, -1, fill=color)
+            lbl = ttk.Label(frame, text=text, foreground=color)
+
+            lbl.grid(row=1, column=i, sticky='W')
+
+            self._lines.append(line)
+
+        for i, (resolution, size) in enumerate(_HISTORY):
+            btn = ttk.Radiobutton(frame, text=_span(resolution * size),
+                                  value=str(i), variable=self._tier,
+                                  command=self._plot, style='Toolbutton')
+
+            btn.grid(row=1, column=len(self._lines) + i, sticky='E')
+
+        self._canvas.grid(row=0, column=0, columnspan=5)
+
+    # Cpu and memory share a scale, the process count has its own.
+    def _plot(self):
+        history = self._parent._history.get(self._watcher)
+        processes = self._parent._pid_history.get(self._watcher, {})
+
+        if self._table.selected in processes:
+            history = processes[self._table.selected]
+
+        if history is None:
+            return
+
+        tier = history.tiers[int(self._tier.get())]
+        series = [tier.values(i) for i in range(3)]
+        width = int(self._canvas['width'])
+        height = int(self._canvas['height'])
+        scale = max([1.0] + [x for x in series[0] + series[1] if x == x])
+
+        for i, (line, values) in enumerate(zip(self._lines, series)):
+            if i == 2:
+                scale = max([1.0] + [x for x in values if x == x])
+
+            _coords(self._canvas, line,
+                    _polyline(values, scale, width, height))
+
+    def _close(self, event=None):
+        self._parent._toplevel = None
+        self._parent._per_pid = self._parent._keep_pid_history
+
+        self._parent.focus_set()
+
+        self._painter.close()
+
+        self.destroy()
+
+    def _center(self):
+        w = self.winfo_width()
+        h = self.winfo_height()
+        x = self._parent.winfo_width() // 2 - w // 2
+        y = self._parent.winfo_height() // 2 - h // 2
+
+        return self._parent.winfo_rootx() + x, self._parent.winfo_rooty() + y
+
+    # Signals are sent by Circus, so remote daemons work too. Circus might
+    # restart a process that is killed by the signal. The outcome is shown
+    # under the buttons, as replies arrive.
+    def _signal(self, signame):
+        pid = self._table.selected
+        properties = {'signum': signame}
+
+        if pid is None:
+            target = 'all processes'
+
+        else:
+            target = 'process {}'.format(pid)
+            properties['pid'] = pid
+
+        if self._children.get():
+            target += ' and children'
+            properties['children'] = True
+
+        _config(self._status, foreground='grey',
+                text='Sending SIG{} to {}…'.format(signame, target))
+
+        self._parent._spawn(self._send_signal(signame, target, properties))
+
+    async def _send_signal(self, signame, target, properties):
+        watcher = self._parent._store[self._watcher]
+        daemon = self._parent._daemons[watcher.daemon]
+        reply = await self._parent._send_signal(daemon, watcher.watcher,
+                                                **properties)
+
+        if self._parent._toplevel is not self:
+            return
+
+        elif reply['status'] == 'ok':
+            _config(self._status, foreground='darkgreen',
+                    text='Sent SIG{} to {}.'.format(signame, target))
+
+        else:
+            _config(self._status, foreground='red',
+                    text='SIG{} to {} failed: {}.'.format(
+                        signame, target, reply.get('reason', 'error')))
+
+# NOTES
+#
+#   [T3] The diagnostics window is created hidden with the application, and
+#   shown or hidden with Control-D. It only refreshes while shown. Rates are
+#   counted between two refreshes.
+#
+class _Diagnostics(Toplevel):
+    '''Diagnostics window. See [T3].'''
+
+    def __init__(self, parent):
+        super().__init__(parent)
+
+        self._parent = parent
+        self._shown = False
+        self._previous = None
+        self._after = None
+
+        outer = ttk.Frame(self, padding=(10, 10, 10, 10))
+        self._text = Text(outer, width=84, height=32, font='TkFixedFont',
+                          wrap='none', borderwidth=0)
+        dump = ttk.Button(outer, text='Dump...', command=self._dump)
+        close = ttk.Button(outer, text='Close', command=self.toggle)
+
+        outer.grid(row=0, column=0, sticky='NSEW')
+        self._text.grid(row=0, column=0, columnspan=2, sticky='NSEW')
+        dump.grid(row=1, column=0, sticky='EW', pady=(10, 0), padx=(0, 5))
+        close.grid(row=1, column=1, sticky='EW', pady=(10, 0), padx=(5, 0))
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        outer.columnconfigure(0, weight=1)
+        outer.columnconfigure(1, weight=1)
+        outer.rowconfigure(0, weight=1)
+
+        self.title('Diagnostics')
+        self.protocol('WM_DELETE_WINDOW', self.toggle)
+        self.bind('<Control-d>', lambda x: self.toggle())
+        self.bind('<Escape>', lambda x: self.toggle())
+        self.withdraw()
+
+    def toggle(self):
+        self._shown = not self._shown
+
+        if self._shown:
+            self.deiconify()
+            self._refresh()
+
+        else:
+            self.withdraw()
+
+            if self._after is not None:
+                self.after_cancel(self._after)
+
+    def _refresh(self):
+        if self._shown:
+            self._text.config(state='normal')
+            self._text.delete('1.0', 'end')
+            self._text.insert('1.0', self._format(self._parent.diagnostics()))
+            self._text.config(state='disabled')
+
+            self._after = self.after(int(_DIAGNOSTICS_INTERVAL * 1000),
+                                     self._refresh)
+
+    def _format(self, data):
+        tpl = '{:<20} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}'
+        ms = lambda x: '{:.1f}'.format(x * 1000)
+        counts = {}
+        lines = []
+
+        for section in ('requests', 'handlers'):
+            lines.append(tpl.format(section.capitalize(), 'count', 'rate/s',
+                                    'mean ms', 'p50', 'p90', 'p99', 'max'))
+
+            for name, x in data[section].items():
+                counts[section, name] = x['count']
+
+                lines.append(tpl.format(
+                    '  ' + name, x['count'], self._rate(data, section, name,
+                                                        x['count']),
+                    ms(x['mean']), ms(x['p50']), ms(x['p90']), ms(x['p99']),
+                    ms(x['max'])))
+
+            lines.append('')
+
+        tpl = '{:<20} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}'
+
+        lines.append(tpl.format('Daemons', 'in flight', 'waiting',
+                                'timeouts', 'queued', 'stats/s', 'events'))
+
+        for name, x in data['daemons'].items():
+            stats = x['stats'] or {}
+
+            lines.append(tpl.format(
+                '  ' + name[:18],
+                x['monitoring']['in_flight'] + x['commands']['in_flight'],
+                x['monitoring']['waiting'] + x['commands']['waiting'],
+                x['monitoring']['timeouts'] + x['commands']['timeouts'],
+                stats.get('queued', '-'),
+                '{:.0f}'.format(stats.get('received_per_second', 0)),
+                'up' if x['events'] else 'down'))
+
+        if 'render' in data:
+            lines.append('')
+            lines.append('Render {frame_rate} frames/s, {coalescing_ratio:.2f}'
+                         ' marks per row'.format(**data['render']))
+
+        lines.append('Watchers {}, uptime {:.0f} s'.format(data['watchers'],
+                                                           data['uptime']))
+
+        self._previous = data['time'], counts
+
+        return '\n'.join(lines)
+
+    def _rate(self, data, section, name, count):
+        if self._previous is None:
+            return '-'
+
+        then, counts = self._previous
+        previous = counts.get((section, name), 0)
+
+        return '{:.0f}'.format((count - previous) /
+                               max(data['time'] - then, 0.001))
+
+    def _dump(self):
+        from tkinter import filedialog  # See [C2].
+
+        path = filedialog.asksaveasfilename(
+            parent=self, defaultextension='.json',
+            initialfile='ringmaster-diagnostics.json')
+
+        if path:
+            with open(path, 'w') as f:
+                f.write(dumps(self._parent.diagnostics(), indent=2))
+
+# NOTES
+#
+#   [G2] Clicking the name of a watcher adds it to the selection, or removes
+#   it. Shift-click selects the namespace of the watcher, the dotted name up
+#   to the last dot, like a pattern typed in the action bar. A pattern
+#   selects the watchers whose dotted names match it, or match it followed
+#   by ".*". The pattern is kept along with the selection (and dropped on a
+#   click), so bulk commands may be sent as a single glob. See [G1].
+#
+class _ActionBar(ttk.Frame):
+    '''Commands on the selected watchers. See [G2].'''
+
+    def __init__(self, parent, application):
+        super().__init__(parent)
+
+        self._app = application
+        self._pattern = StringVar(self)
+        self._count = StringVar(self, '1')
+        self._signal = StringVar(self, _SIGNALS[0])
+        self._children = BooleanVar(self, False)
+        self._selected = ttk.Label(self, width=12)
+        self._status = ttk.Label(self, foreground='grey')
+        self._buttons = []
+
+        entry = ttk.Entry(self, textvariable=self._pattern, width=16)
+        select = ttk.Button(self, text='Select', command=self._select)
+        actions = ttk.Frame(self)
+
+        entry.grid(row=0, column=0, sticky='EW')
+        select.grid(row=0, column=1, padx=(5, 0))
+        self._selected.grid(row=0, column=2, padx=(5, 0))
+        actions.grid(row=1, column=0, columnspan=3, sticky='W', pady=(5, 0))
+        self._status.grid(row=2, column=0, columnspan=3, sticky='W')
+
+        self.columnconfigure(0, weight=1)
+
+        entry.bind('<Return>', lambda x: self._select())
+
+        widgets = [
+            self._button(actions, 'Start', partial(self._send, 'start')),
+            self._button(actions, 'Stop', partial(self._send, 'stop')),
+            self._button(actions, 'Restart', partial(self._send, 'restart')),
+            self._button(actions, 'Incr', partial(self._send_count, 'incr')),
+            self._button(actions, 'Decr', partial(self._send_count, 'decr')),
+            ttk.Entry(actions, textvariable=self._count, width=3),
+            self._button(actions, 'Signal', self._send_signal),
+            ttk.Combobox(actions, textvariable=self._signal, width=5,
+                         values=_SIGNALS, state='readonly'),
+            ttk.Checkbutton(actions, text='Children',
+                            variable=self._children),
+            self._button(actions, 'Clear', self._app._clear_selection),
+        ]
+
+        for i, x in enumerate(widgets):
+            x.grid(row=0, column=i, padx=(0, 2))
+
+        self.selection(0)
+
+    def selection(self, count):
+        '''Show the number of selected watchers.'''
+
+        _config(self._selected, text='{} selected'.format(count))
+
+        for x in self._buttons:
+            x.state(['!disabled' if count else 'disabled'])
+
+    def progress(self, batch):
+        '''Show the summary of a bulk command.'''
+
+        _config(self._status, text=batch.summary(),
+                foreground='red' if batch.failed else 'grey')
+
+    def _select(self):
+        if self._pattern.get().strip():
+            self._app._select_pattern(self._pattern.get().strip())
+
+    def _send(self, action):
+        self._app._bulk_command(action)
+
+    def _send_count(self, action):
+        try:
+            count = int(self._count.get())
+
+        except ValueError:
+            count = 0
+
+        if count > 0:
+            self._app._bulk_command(action, nb=count)
+
+        else:
+            _config(self._status, text='Not a number of processes.',
+                    foreground='red')
+
+    def _send_signal(self):
+        if self._children.get():
+            self._app._bulk_command('signal', signum=self._signal.get(),
+                                    children=True)
+
+        else:
+            self._app._bulk_command('signal', signum=self._signal.get())
+
+    def _button(self, parent, text, command):
+        btn = ttk.Button(parent, text=text, width=7, command=command)
+
+        self._buttons.append(btn)
+
+        return btn
+
+class _AlertList(ttk.Frame):
+    '''Alerts that are firing, newest first. See [L1].'''
+
+    def __init__(self, parent, application):
+        super().__init__(parent)
+
+        self._app = application
+        self._title = ttk.Label(self, font='TkHeadingFont')
+        self._text = Text(self, width=48, height=_ALERT_ROWS, wrap='none',
+                          borderwidth=0, foreground='firebrick',
+                          background=self._app.cget('background'))
+
+        self._title.grid(row=0, column=0, sticky='W')
+        self._text.grid(row=1, column=0, sticky='EW', pady=(5, 0))
+
+        self.columnconfigure(0, weight=1)
+
+        self.dirty = False
+
+    def refresh(self):
+        alerts = self._app._alerts.firing
+        store = self._app._store
+        lines = []
+
+        for (name, rule), (when, value) in reversed(list(alerts.items())):
+            watcher = _DOT(store[name].watcher)
+
+            if len(self._app._daemons) > 1:
+                watcher = store[name].daemon + '/' + watcher
+
+            lines.append('{}  {}  {}, {}'.format(
+                strftime('%H:%M:%S', localtime(when)), watcher, rule.name,
+                rule.format(value)))
+
+        _config(self._title, text='Alerts ({})'.format(len(lines)))
+
+        self._text.config(state='normal')
+        self._text.delete('1.0', 'end')
+        self._text.insert('1.0', '\n'.join(lines))
+        self._text.config(state='disabled')
+
+        if lines:
+            self.grid()
+
+        else:
+            self.grid_remove()
+
+        self.dirty = False
+
+# NOTES
+#
+#   [E3] An idle window blocks in Tk, not in a poll. The selector of the event
+#   loop hands its waits to "dooneevent", with a file handler on the selector
+#   itself (readable when any of its sockets is) and a Tk timer for the next
+#   asyncio timer. So Tk input, ZMQ messages and timers all end the wait, and
+#   the window costs no CPU until one of them comes. Tk input that arrives
+#   while asyncio is busy is taken one event per loop iteration.
+#
+class _TkSelector(DefaultSelector):
+    '''Selector that waits in the Tk event loop. See [E3].'''
+
+    def __init__(self):
+        super().__init__()
+
+        self._tk = None
+        self._fired = False
+
+    @staticmethod
+    def supported(tk):
+        '''Whether Tk can watch the selector, which is not so on Windows.'''
+
+        return (hasattr(DefaultSelector, 'fileno') and
+                hasattr(tk, 'createfilehandler'))
+
+    def attach(self, tk, wake, lag):
+        '''Start waiting in Tk. Call "wake" after Tk input, and observe the
+        lag of timers on histogram "lag". See [E2], in "ringmaster".'''
+
+        self._tk = tk
+        self._wake = wake
+        self._lag = lag
+
+        tk.createcommand('ringmaster_timer', self._fire)
+
+    def detach(self):
+        if self._tk is not None:
+            self._tk.deletecommand('ringmaster_timer')
+
+        self._tk = None
+
+    def select(self, timeout=None):
+        tk = self._tk
+
+        if tk is None:
+            return super().select(timeout)
+
+        ready = super().select(0)
+
+        if ready or timeout is not None and timeout < 0.001:
+            if tk.dooneevent(ALL_EVENTS | DONT_WAIT):
+                self._wake()
+
+            return ready
+
+        self._fired = False
+
+        tk.createfilehandler(self.fileno(), READABLE, self._fire)
+
+        if timeout is not None:
+            timer = tk.call('after', ceil(timeout * 1000), 'ringmaster_timer')
+
+        start = monotonic()
+
+        try:
+            tk.dooneevent(ALL_EVENTS)
+
+        finally:
+            tk.deletefilehandler(self.fileno())
+
+            if timeout is not None:
+                tk.call('after', 'cancel', timer)
+
+        ready = super().select(0)
+
+        if not self._fired:
+            self._wake()
+
+        elif timeout is not None and not ready:  # See [E2].
+            self._lag.observe(max(0, monotonic() - start - timeout))
+
+        return ready
+
+    def _fire(self, *args):
+        self._fired = True
+
+# NOTES
+#
+#  [A1] Use this customizable font for the entire GUI.
+#
+#    http://stackoverflow.com/a/4073037
+#
+#  [A2] This will make Command+Q quit the Tk application.
+#
+#    http://mail.python.org/pipermail/tkinter-discuss/2009-April/001900.html.
+#
+#  [A3] Enhance the disabled state. Use gray for foreground color. See the
+#  "State Specific Style Options" section of the following tutorial.
+#
+#    http://www.tkdocs.com/tutorial/styles.html
+#
+class _Application(_Monitor, Tk):
+    '''Ringmaster main application window.'''
+
+    def __init__(self, daemons, parent=None, alerts=_ALERTS, hook=None,
+                 cache=_CACHE_DIR, selector=None,
+                 pid_history=_PID_HISTORY):
+        Tk.__init__(self, parent)
+        _Monitor.__init__(self, daemons, alerts, hook, cache, pid_history)
+
+        # Internal.
+        self._toplevel = None
+        self._busy = set()
+        self._selection = set()
+        self._pattern = None
+        self._render = _RenderScheduler(self._render_rows)
+        self._tree = _Namespaces(self._store, self._render.mark)
+        self._delay = _TK_INTERVAL_MIN
+        self._wakeup = Future()
+        self._tk_events = _Histogram()
+        self._selector = None
+
+        if selector is not None and selector.supported(self.tk):  # See [E3].
+            self._selector = selector
+
+            selector.attach(self.tk, self._wake, self._lag)
+
+        # GUI.
+        self._font = font.Font(family='Helvetica', size=12)  # See [A1].
+        self._master = ttk.Frame(self, name='master', padding=(10, 10, 10, 10))
+        self._title = ttk.Label(self._master, text='Watchers', font='-size 16')
+        self._list = _WatcherList(self._master, self)
+        self._alert_list = _AlertList(self._master, self)
+        self._actions = _ActionBar(self._master, self)
+        self._button = ttk.Button(self._master, text='Quit')
+
+        self.createcommand('::tk::mac::Quit', self._quit)  # See [A2].
+        self.protocol('WM_DELETE_WINDOW', self._quit)
+        self.resizable(False, True)
+        self.minsize(320, 160)
+        self.title(_TITLE)
+
+        self._master.grid(row=0, column=0, sticky='NSEW')
+        self._title.grid(row=0, column=0, pady=(0, 10))
+        self._list.grid(row=1, column=0, sticky='NSEW')
+        self._alert_list.grid(row=2, column=0, sticky='EW', pady=(10, 0))
+        self._actions.grid(row=3, column=0, sticky='EW', pady=(10, 0))
+        self._button.grid(row=4, column=0, sticky='EW', pady=(10, 0))
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self._master.columnconfigure(0, weight=1)
+        self._master.rowconfigure(1, weight=1)
+
+        self._diagnostics = _Diagnostics(self)
+
+        self._alert_list.grid_remove()
+
+        self._button.bind('<Button-1>', lambda x: self._quit())
+        self.bind('<Control-d>', lambda x: self._diagnostics.toggle())
+
+        self._store.subscribe(self._tree.update)
+        self._store.subscribe(self._render.mark)
+
+    async def paint(self):
+        ttk.Style().map('TLabel', foreground=[('disabled', 'gray')])  # [A3].
+        ttk.Style().map('TButton', foreground=[('disabled', 'gray')])
+
+        await super().paint()
+
+    def diagnostics(self):
+        result = super().diagnostics()
+        result['render'] = self._render.counters()
+
+        return result
+
+    def _timings(self):
+        result = super()._timings()
+        result['render'] = self._render.durations
+        result['tk events'] = self._tk_events
+
+        return result
+
+    def _rows_added(self, names):
+        for x in names:
+            self._tree.add(x)
+
+        self._list.extend(names)
+
+    def _row_removed(self, name):
+        self._tree.remove(name)
+        self._list.remove(name)
+        self._alert_list.refresh()
+
+        if name in self._selection:
+            self._selection.discard(name)
+
+            self._actions.selection(len(self._selection))
+
+    def _process_changed(self, name):
+        if self._toplevel and self._toplevel._watcher == name:
+            self._render.mark(name)
+
+    def _alerted(self, name):
+        self._alert_list.dirty = True
+
+        self._render.mark(name)
+
+    def _busy_row(self, name, busy):
+        '''Ignore (or not) clicks on the command buttons of a row.'''
+
+        if busy:
+            self._busy.add(name)
+
+        else:
+            self._busy.discard(name)
+
+        self._render.mark(name)
+
+    # Taken from "http://www.reddit.com/r/Python/comments/33ecpl".
+    #
+    # For a threaded approach, see the ActiveState recipe mentioned by Guido
+    # van Rossum at the "Tkinter-discuss" list ("http://goo.gl/VJI1oJ").
+    #
+    # NOTES
+    #
+    #   [E1] Without a Tk selector (see [E3]), as with uvloop or on Windows,
+    #   Tk is polled. The interval between two runs of the Tk event loop
+    #   adapts to the activity. It drops to "_TK_INTERVAL_MIN" whenever Tk had
+    #   events to process, and doubles on every idle run up to
+    #   "_TK_INTERVAL_MAX", one frame, so that the first click or key after a
+    #   while idle waits no longer than a frame. Renders call "_wake", so that
+    #   the redraw they cause is not delayed either. The lag is measured as
+    #   in "ringmaster", see [E2] there.
+    #
+    async def mainloop(self, limit=1000):
+        '''Run a tkinter app in an asyncio event loop.'''
+
+        try:
+            while self._running and self.winfo_exists():
+                start = monotonic()
+
+                for i in range(limit):
+                    if not self.tk.dooneevent(ALL_EVENTS | DONT_WAIT):
+                        break
+
+                self._tk_events.observe(monotonic() - start)
+
+                self._wakeup = Future()
+
+                if self._selector is not None:  # See [E3].
+                    await self._wakeup
+
+                    continue
+
+                if i > 0:
+                    self._delay = _TK_INTERVAL_MIN
+
+                else:
+                    self._delay = min(self._delay * 2, _TK_INTERVAL_MAX)
+
+                start = monotonic()
+
+                await wait([self._wakeup], timeout=self._delay)
+
+                if not self._wakeup.done():  # See [E2].
+                    self._lag.observe(
+                        max(0, monotonic() - start - self._delay))
+
+        finally:
+            if self._selector is not None:
+                self._selector.detach()
+
+    def _reachable(self, name):  # See [M3].
+        down = sum(1 for x in self._daemons.values() if not x.reachable)
+
+        if not down:
+            _config(self._title, text='Watchers', foreground='')
+
+        elif len(self._daemons) == 1:
+            _config(self._title, text='Watchers (unreachable)',
+                    foreground='red')
+
+        else:
+            text = 'Watchers ({} of {} unreachable)'
+
+            _config(self._title, text=text.format(down, len(self._daemons)),
+                    foreground='red')
+
+        self._render.mark(name + '/')
+
+    def _paint_header(self, row, name):  # See [V3].
+        row.layout('header')
+
+        _config(row.lb1, background='')
+
+        _bind(row.lb1, None)
+
+        if self._daemons[name].reachable:
+            _config(row.lb1, text=name, width=0, foreground='',
+                    font='TkHeadingFont')
+
+        else:
+            _config(row.lb1, text=name + ' (unreachable)', width=0,
+                    foreground='red', font='TkHeadingFont')
+
+    def _paint_group(self, row, key, label):  # See [W1].
+        group = self._tree.groups[key]
+
+        row.layout('group')
+
+        _config(row.lb1, text=('▸ ' if group.collapsed else '▾ ') + label,
+                foreground='', font='TkHeadingFont', background='')
+
+        _bind(row.lb1, partial(self._list.toggle, key))
+
+        if group.procs:
+            _config(row.lb2, foreground='darkgreen',
+                    text='{}: {:.1%} cpu, {:.1%} mem'.format(
+                        group.procs, group.cpu, group.mem))
+
+        else:
+            _config(row.lb2, foreground='grey', text='–')
+
+    def _wake(self):  # See [E1].
+        self._delay = _TK_INTERVAL_MIN
+
+        if not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    def _render_rows(self, names):  # See [R1].
+        self._list.render(names)
+
+        if self._alert_list.dirty:
+            self._alert_list.refresh()
+
+        if self._toplevel and self._toplevel._watcher in names:
+            self._toplevel._painter.send(None)
+
+        self._wake()
+
+    def _update_watcher_state_a(self, row, name, label=None):  # See [LEAK].
+        watcher = self._store[name]
+        procs = watcher.pids
+        busy = name in self._busy
+
+        row.layout('singleton' if watcher.singleton else 'normal')
+
+        if name in self._selection:
+            background = 'lightsteelblue'
+
+        elif self._alerts.alerting(name):
+            background = 'mistyrose'
+
+        else:
+            background = ''
+
+        _config(row.lb1, text=label or _DOT(watcher.watcher), foreground='',
+                font='', background=background)
+
+        _bind(row.lb1, partial(self._select_row, name))
+
+        if procs and watcher.cpu is not None:
+            # http://docs.python.org/3/library/string.html#format-examples.
+            tpl = '{}: {:.1%} cpu, {:.1%} mem'
+
+            _config(row.lb2, foreground='darkgreen',
+                    text=tpl.format(len(procs), watcher.cpu, watcher.mem))
+
+        elif procs:
+            _config(row.lb2, foreground='darkgreen', text='–')
+
+        elif watcher.singleton is None:
+            _config(row.lb2, foreground='grey', text='…')
+
+        else:
+            _config(row.lb2, foreground='grey', text='–')
+
+        self._paint_spark(row, name)
+
+        if watcher.singleton is None:
+            _config(row.bt1, text='Incr', state='disabled')
+            _config(row.bt2, state='disabled')
+            _config(row.bt3, state='disabled')
+
+            _bind(row.bt1, None)
+            _bind(row.bt2, None)
+            _bind(row.bt3, None)
+
+        elif watcher.singleton:
+            if procs:
+                _config(row.bt1, text='Stop', state='normal')
+                _config(row.bt3, state='normal')
+
+                _bind(row.bt1, None if busy else
+                      partial(self._stop_watcher, name))
+                _bind(row.bt3, partial(self._more_watcher, name))
+
+            else:
+                _config(row.bt1, text='Start', state='normal')
+                _config(row.bt3, state='disabled')
+
+                _bind(row.bt1, None if busy else
+                      partial(self._start_watcher, name))
+                _bind(row.bt3, None)
+
+        else:
+            _config(row.bt1, text='Incr', state='normal')
+
+            _bind(row.bt1, None if busy else
+                  partial(self._incr_process, name))
+
+            if procs:
+                _config(row.bt2, state='normal')
+                _config(row.bt3, state='normal')
+
+                _bind(row.bt2, None if busy else
+                      partial(self._decr_process, name))
+                _bind(row.bt3, partial(self._more_watcher, name))
+
+            else:
+                _config(row.bt2, state='disabled')
+                _config(row.bt3, state='disabled')
+
+                _bind(row.bt2, None)
+                _bind(row.bt3, None)
+
+    def _paint_spark(self, row, name):
+        if name in self._history:
+            tier = self._history[name].tiers[0]
+            cpu = tier.values(0, _SPARK_SAMPLES)
+            mem = tier.values(1, _SPARK_SAMPLES)
+
+        else:
+            cpu = mem = []
+
+        scale = max([1.0] + [x for x in cpu + mem if x == x])
+
+        _coords(row.spark, row.cpu, _polyline(cpu, scale, *_SPARK_SIZE))
+        _coords(row.spark, row.mem, _polyline(mem, scale, *_SPARK_SIZE))
+
+    # Once Circus accepts a command, the actual state of the watcher is read
+    # back by "_on_reply", instead of guessed. See [S1].
+    def _command(self, action, name):
+        def ok(reply):
+            self._busy_row(name, False)
+
+        def error(message):
+            self._busy_row(name, False)
+
+            from tkinter import messagebox  # See [C2].
+
+            messagebox.showerror('Error', message + '.')
+
+        self._busy_row(name, True)
+
+        self._spawn(self._on_reply(action, name, ok, error))
+
+    def _start_watcher(self, name, event):
+        self._command('start', name)
+
+    def _stop_watcher(self, name, event):
+        self._command('stop', name)
+
+    def _more_watcher(self, name, event):
+        self._toplevel = _Dialog(self, name)
+
+    def _incr_process(self, name, event):
+        if self._store[name].state == 'stopped':
+            self._command('start', name)
+
+        else:
+            self._command('incr', name)
+
+    def _decr_process(self, name, event):
+        self._command('decr', name)
+
+    def _select_row(self, name, event):  # See [G2].
+        if event.state & 0x1:
+            head, dot, tail = _DOT(self._store[name].watcher).rpartition('.')
+
+            self._select_pattern(head or tail)
+
+        else:
+            self._set_selection(self._selection ^ {name}, None)
+
+    def _select_pattern(self, pattern):
+        names = {x for x in self._store
+                 if fnmatchcase(_DOT(self._store[x].watcher), pattern) or
+                 fnmatchcase(_DOT(self._store[x].watcher), pattern + '.*')}
+
+        self._set_selection(names, pattern)
+
+    def _clear_selection(self):
+        self._set_selection(set(), None)
+
+    def _set_selection(self, names, pattern):
+        for x in self._selection ^ names:
+            self._render.mark(x)
+
+        self._selection = names
+        self._pattern = pattern
+
+        self._actions.selection(len(names))
+
+    # Rows are busy until the command for the whole selection is done.
+    def _bulk_command(self, action, **properties):  # See [G1].
+        names = sorted(x for x in self._selection if x not in self._busy)
+        batch = _Batch(action, len(names), self._actions.progress)
+
+        async def run():
+            try:
+                await self._bulk(action, names, batch, self._pattern,
+                                 **properties)
+
+            finally:
+                for x in names:
+                    self._busy_row(x, False)
+
+        for x in names:
+            self._busy_row(x, True)
+
+        self._actions.progress(batch)
+
+        self._spawn(run())
+
+    def _quit(self):
+        super()._quit()
+
+        self._wake()
@@ -7,8 +7,10 @@ setup(
     author='Rafael Viotti',
     author_email='rviotti@gmail.com',
     install_requires=['aiozmq'],
+    extras_require={'uvloop': ['uvloop']},
+    python_requires='>=3.5',
     url='https://github.com/viotti/ringmaster',
     download_url = 'https://github.com/viotti/ringmaster/tarball/0.6.1',
-    py_modules=['ringmaster'],
+    py_modules=['ringmaster', 'ringmaster_tk'],
     entry_points = {'console_scripts': ['ringmaster = ringmaster:main']}
 )
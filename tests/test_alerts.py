@@ -0,0 +1,100 @@
+from time import monotonic
+from unittest import TestCase, main
+
+from ringmaster import _ALERTS, _Alerts, _Monitor, _Rule, _WatcherStore
+
+class FlappingTest(TestCase):
+    '''The "spawns" metric counts respawns only. See [L4].'''
+
+    def setUp(self):
+        self.fired = []
+
+        # The event handling of a monitor, without its daemons.
+        self.monitor = _Monitor.__new__(_Monitor)
+        self.monitor._store = _WatcherStore()
+        self.monitor._alerts = _Alerts(
+            self.monitor._store, [_Rule(*x) for x in _ALERTS],
+            lambda name, rule, value, firing: self.fired.append(rule.name))
+
+        self.monitor._store.add('web', 'localhost', 'web')
+
+    def event(self, event, pid):
+        self.monitor._apply_event('web', event, {'process_pid': pid},
+                                  monotonic())
+
+    def test_bulk_incr(self):
+        self.monitor._alerts.expect('web')
+
+        for pid in range(10):
+            self.event('spawn', pid)
+
+        self.monitor._alerts.expect('web')
+
+        self.assertEqual(self.fired, [])
+
+    def test_restart(self):
+        for pid in range(10):
+            self.event('spawn', pid)
+
+        self.monitor._alerts.expect('web')
+
+        for pid in range(10):
+            self.event('kill', pid)
+
+        self.event('stop', None)
+        self.event('start', None)
+
+        for pid in range(10, 20):
+            self.event('spawn', pid)
+
+        self.assertEqual(self.fired, [])
+
+    def test_respawns(self):
+        self.event('spawn', 0)
+
+        for pid in range(1, 7):
+            self.event('reap', pid - 1)
+            self.event('spawn', pid)
+
+        self.assertEqual(self.fired, ['flapping'])
+
+class StoppedTest(TestCase):
+    '''A watcher without processes has no usage left to alert on.'''
+
+    def setUp(self):
+        self.fired = []
+
+        self.monitor = _Monitor.__new__(_Monitor)
+        self.monitor._store = _WatcherStore()
+        self.monitor._alerts = _Alerts(
+            self.monitor._store, [_Rule(*x) for x in _ALERTS],
+            lambda name, rule, value, firing: self.fired.append(
+                (rule.name, firing)))
+
+        self.monitor._store.add('web', 'localhost', 'web')
+        self.monitor._store.update('web', state='active',
+                                   pids=frozenset([1]), cpu=0.95, mem=0.1)
+
+    def test_stop(self):
+        now = monotonic()
+
+        self.monitor._alerts.evaluate('web', now)
+        self.monitor._alerts.evaluate('web', now + 30)
+
+        self.monitor._apply_event('web', 'stop', {}, now + 31)
+
+        self.assertEqual(self.fired, [('cpu', True), ('cpu', False)])
+        self.assertEqual(self.monitor._store['web'].cpu, 0)
+
+    def test_poll(self):
+        now = monotonic()
+
+        self.monitor._alerts.evaluate('web', now)
+        self.monitor._apply_poll('web', 'stopped', [])
+        self.monitor._alerts.evaluate('web', now + 30)
+
+        self.assertEqual(self.fired, [])
+        self.assertEqual(self.monitor._store['web'].mem, 0)
+
+if __name__ == '__main__':
+    main()